@@ -0,0 +1,73 @@
+import argparse
+import io
+import time
+from datetime import timedelta
+from typing import Dict
+from githubAPI import GithubParallelTraversing
+from githubGraphQL import GithubGraphQLTraversing
+from githubStub import GithubStubServer, SyntheticRepository
+
+
+def run_benchmark(flags: Dict[str, str]) -> None:
+    repo = SyntheticRepository(pull_count=int(flags["pulls"]), issue_count=int(flags["issues"]), commits_per_pull=int(flags["commits"]),
+                               comments_per_pull=int(flags["comments"]), user_count=int(flags["users"]))
+    server = GithubStubServer(repo=repo, latency=float(flags["latency_ms"]) / 1000, rate_limit=int(flags["rate_limit"]),
+                              rate_window=int(flags["rate_window"]), replay_file=flags["replay"]).start()
+    tokens = ["token{}".format(index) for index in range(int(flags["tokens"]))]
+    # Every number of the synthetic repository falls within the window
+    start = repo.created_at(0)
+    stop = repo.created_at(len(repo.numbers) + 1) + timedelta(days=1)
+
+    log = io.StringIO()
+    phases: list[tuple[str, float, int]] = []
+
+    def phase(name, function):
+        requests_before = server.state.total_requests()
+        phase_start = time.monotonic()
+        result = function()
+        phases.append((name, time.monotonic() - phase_start, server.state.total_requests() - requests_before))
+        return result
+
+    wall_start = time.monotonic()
+    if flags["backend"] == "graphql":
+        ght = phase("setup", lambda: GithubGraphQLTraversing(tokens, out_buffer=log, max_workers=int(flags["threads"]), base_url=server.base_url))
+    else:
+        ght = phase("setup", lambda: GithubParallelTraversing(tokens, out_buffer=log, max_workers=int(flags["threads"]), base_url=server.base_url))
+    phase("repo details", lambda: ght.get_repo_details(repo.full_name))
+    pull_list = phase("pull list", lambda: ght.get_pull_list(start, stop))
+    phase("pull records", lambda: list(ght.get_pull_record_many(pull_list, start, stop)))
+    issue_list = phase("issue list", lambda: ght.get_issue_list(start, stop))
+    phase("issue details", lambda: list(ght.get_issue_details_many(issue_list)))
+    wall = time.monotonic() - wall_start
+    ght.close()
+    server.stop()
+
+    total_requests = server.state.total_requests()
+    print("Backend {}, {} tokens, {} threads, {} ms latency".format(flags["backend"], len(tokens), flags["threads"] or "default", flags["latency_ms"]))
+    print("Crawled {} pulls and {} issues".format(len(pull_list), len(issue_list)))
+    for name, seconds, request_count in phases:
+        print("{:>15} {:>10.2f}s {:>8} requests".format(name, seconds, request_count))
+    print("Wall time: {:.2f}s, {:.2f}s per 1k pulls".format(wall, wall / max(1, len(pull_list)) * 1000))
+    print("Requests: {}, {:.1f} requests/s, {:.2f} requests per pull, {} answered 304, {} rate limited".format(
+        total_requests, total_requests / wall if wall > 0 else 0, total_requests / max(1, len(pull_list)), server.state.not_modified,
+        server.state.rate_limited))
+    print("Requests per route: {}".format(", ".join("{} {}".format(k, v) for k, v in server.state.requests.most_common())))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Crawl a local GitHub stand-in and report the crawler throughput")
+    parser.add_argument("-b", "--backend", help="GitHub API used to crawl pulls and issues", type=str, choices=["rest", "graphql"], default="rest")
+    parser.add_argument("-p", "--pulls", help="Synthetic pull requests", type=int, default=1000)
+    parser.add_argument("-i", "--issues", help="Synthetic issues", type=int, default=1000)
+    parser.add_argument("-cm", "--commits", help="Commits per pull request", type=int, default=3)
+    parser.add_argument("-co", "--comments", help="Comments per pull request", type=int, default=3)
+    parser.add_argument("-u", "--users", help="Distinct authors", type=int, default=100)
+    parser.add_argument("-l", "--latency_ms", help="Latency added to every response in milliseconds", type=float, default=20)
+    parser.add_argument("-rl", "--rate_limit", help="Requests per token and window", type=int, default=5000)
+    parser.add_argument("-rw", "--rate_window", help="Rate-limit window in seconds", type=int, default=3600)
+    parser.add_argument("-r", "--replay", help="Recorded responses to serve instead of the synthetic repository", type=str, default=None)
+    parser.add_argument("-gt", "--tokens", help="Stand-in tokens", type=int, default=2)
+    parser.add_argument("-gth", "--threads", help="Concurrent GitHub requests, 0 for the crawler default", type=int, default=0)
+    args = parser.parse_args()
+
+    run_benchmark(vars(args))
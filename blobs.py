@@ -0,0 +1,63 @@
+import subprocess
+from collections import OrderedDict
+from threading import Lock
+from typing import Optional
+
+
+class BlobReader:
+    NULL_SHA = "0" * 40
+
+    def __init__(self, local_path: str, cache_bytes: int = 256 * 1024 * 1024):
+        self.local_path = local_path
+        self.cache_bytes = cache_bytes
+        self.cached_bytes = 0
+        self.cache: OrderedDict[str, bytes] = OrderedDict()
+        self.lock = Lock()
+        # One long-lived process serves every blob of the repository
+        self.process = subprocess.Popen(['git', '-C', local_path, 'cat-file', '--batch'], stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+    def read(self, sha: Optional[str]) -> Optional[bytes]:
+        if sha is None or sha == self.NULL_SHA:
+            return None
+
+        with self.lock:
+            data = self.cache.get(sha)
+            if data is not None:
+                self.cache.move_to_end(sha)
+                return data
+
+            self.process.stdin.write((sha + "\n").encode())
+            self.process.stdin.flush()
+            # Header is "<sha> <type> <size>" or "<sha> missing"
+            header = self.process.stdout.readline().decode().split()
+            if len(header) != 3:
+                return None
+            data = self.process.stdout.read(int(header[2]))
+            self.process.stdout.read(1)
+            # Submodules point to commits, they have no source code
+            if header[1] != "blob":
+                return None
+
+            self.cache[sha] = data
+            self.cached_bytes += len(data)
+            while self.cached_bytes > self.cache_bytes and len(self.cache) > 1:
+                _, evicted = self.cache.popitem(last=False)
+                self.cached_bytes -= len(evicted)
+            return data
+
+    def text(self, sha: Optional[str]) -> Optional[str]:
+        # Same decoding of pydriller's source_code and source_code_before
+        data = self.read(sha)
+        return data.decode('utf-8', 'ignore') if data is not None else None
+
+    def line_count(self, sha: Optional[str]) -> Optional[int]:
+        # No need to decode, a newline byte never appears inside a multi-byte UTF-8 sequence
+        data = self.read(sha)
+        return data.count(b"\n") if data is not None else None
+
+    def close(self) -> None:
+        with self.lock:
+            self.process.stdin.close()
+            self.process.wait()
+            self.cache.clear()
+            self.cached_bytes = 0
@@ -0,0 +1,69 @@
+import sqlite3
+import time
+from threading import Lock
+from typing import Optional
+
+
+class SqliteLruCache:
+    def __init__(self, filename: str, max_bytes: int):
+        self.filename = filename
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        # One connection shared by all threads, serialized by the lock. Other processes may use the same file, wait for their writes
+        self.lock = Lock()
+        self.connection = sqlite3.connect(filename, isolation_level=None, check_same_thread=False, timeout=60)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, "
+                                "last_access REAL NOT NULL)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)")
+        self.total_bytes = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self.lock:
+            row = self.connection.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.connection.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+            return row[0]
+
+    def put(self, key: str, value: bytes) -> None:
+        with self.lock:
+            row = self.connection.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                self.total_bytes -= row[0]
+            self.connection.execute("INSERT OR REPLACE INTO entries (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                                    (key, value, len(value), time.time()))
+            self.total_bytes += len(value)
+            self._evict()
+
+    def _evict(self) -> None:
+        if self.total_bytes > self.max_bytes:
+            # Other processes may have evicted or added entries in the meantime
+            self.total_bytes = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        # Drop the least recently used entries until the cache fits its size bound again
+        while self.total_bytes > self.max_bytes:
+            rows = self.connection.execute("SELECT key, size FROM entries ORDER BY last_access LIMIT 100").fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                self.connection.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self.total_bytes -= size
+                self.evictions += 1
+                if self.total_bytes <= self.max_bytes:
+                    break
+
+    def stats(self) -> str:
+        lookups = self.hits + self.misses
+        ratio = self.hits / lookups * 100 if lookups != 0 else 0
+        return "{} hits, {} misses ({:.1f}% hit ratio), {} evictions, {} bytes in {}".format(self.hits, self.misses, ratio, self.evictions,
+                                                                                             self.total_bytes, self.filename)
+
+    def close(self) -> None:
+        with self.lock:
+            self.connection.close()
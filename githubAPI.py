@@ -1,72 +1,180 @@
 import sys
+import time
 import github
 import pause
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from github import Github, Repository
-from typing import List, Dict
+from github.NamedUser import NamedUser
+from github.PullRequest import PullRequest
+from threading import Lock
+from typing import Iterator, List, Dict, Optional, Tuple
+
+
+class RateLimitBucket:
+    def __init__(self, login: str, token: str):
+        self.login = login
+        self.token = token
+        self.remaining = 0
+        self.limit = 0
+        self.reset = 0
+
+
+class RateLimitTracker:
+    def __init__(self):
+        self.lock = Lock()
+        self.buckets: dict[Github, RateLimitBucket] = dict()
+        self.rotation = 0
+
+    def add(self, gh_api: Github, login: str, token: str) -> None:
+        self.buckets[gh_api] = RateLimitBucket(login, token)
+        self.observe(gh_api)
+
+    def observe(self, gh_api: Github) -> None:
+        # X-RateLimit-* headers of the last response, PyGithub keeps them without any extra request
+        remaining, limit = gh_api.rate_limiting
+        self.update(gh_api, remaining, limit, gh_api.rate_limiting_resettime)
+
+    def update(self, key, remaining: int, limit: int, reset: int) -> None:
+        with self.lock:
+            bucket = self.buckets[key]
+            if reset <= time.time():
+                # Headers of a window that is over, e.g., those kept from before a refill, they no longer tell anything
+                return
+            if reset > bucket.reset:
+                # New window, trust the headers
+                bucket.remaining = remaining
+            else:
+                # Same window, concurrent responses may arrive out of order, keep the most conservative value
+                bucket.remaining = min(bucket.remaining, remaining)
+            bucket.limit = limit
+            bucket.reset = reset
+
+    def acquire(self, min_requests: int) -> Optional[Github]:
+        for gh_api in self.buckets:
+            self.observe(gh_api)
+        with self.lock:
+            # Concurrent callers take usable tokens in turn, so all of them serve requests at once
+            gh_apis = list(self.buckets.items())
+            for index in range(len(gh_apis)):
+                gh_api, bucket = gh_apis[(self.rotation + index) % len(gh_apis)]
+                if bucket.remaining >= min_requests:
+                    self.rotation += index + 1
+                    bucket.remaining -= 1
+                    return gh_api
+            return None
+
+    def get_bucket(self, gh_api: Github) -> RateLimitBucket:
+        return self.buckets[gh_api]
+
+    def earliest_reset(self) -> Github:
+        with self.lock:
+            return min(self.buckets.items(), key=lambda x: x[1].reset)[0]
+
+    def refill(self, gh_api: Github) -> None:
+        with self.lock:
+            bucket = self.buckets[gh_api]
+            # The window is over, the headers of the next response tell the actual state
+            bucket.remaining = bucket.limit
+            bucket.reset = 0
 
 
 class GithubParallelTraversing:
-    def __init__(self, tokens: List[str], out_buffer=sys.stdout):
+    def __init__(self, tokens: List[str], out_buffer=sys.stdout, max_workers: Optional[int] = None, base_url: str = github.Consts.DEFAULT_BASE_URL):
         self.out_buffer = out_buffer
         self.name = None
 
-        self.token_map: dict[str, str] = dict()
+        # Objects fetched for the current repository, see get_repo_details
+        self.repo_cache: dict[Github, Repository] = dict()
+        self.comment_cache: dict[int, object] = dict()
+        self.issue_cache: dict[int, object] = dict()
+        self.user_cache: dict[str, Tuple[str, Optional[str], Optional[str]]] = dict()
+
+        self.rate_limits = RateLimitTracker()
         self.gh_api_list: set[Github] = set()
         for token in tokens:
             try:
-                # Prepare new GitHub connection, token based authentication
-                gh_api = Github(auth=github.Auth.Token(token))
-                self.out_buffer.write("GitHub user {} has {} requests per hour, used {}\n"
-                                      .format(gh_api.get_user().login, gh_api.get_rate_limit().core.limit, gh_api.get_rate_limit().core.used))
+                # Prepare new GitHub connection, token based authentication. The only request per token, it also fills the rate-limit headers
+                gh_api = Github(auth=github.Auth.Token(token), base_url=base_url)
+                login = gh_api.get_user().login
+                self.rate_limits.add(gh_api, login, token)
+                bucket = self.rate_limits.get_bucket(gh_api)
+                self.out_buffer.write("GitHub user {} has {} requests per hour, used {}\n".format(login, bucket.limit, bucket.limit - bucket.remaining))
                 self.gh_api_list.add(gh_api)
-                self.token_map[gh_api.get_user().login] = token
             except github.GithubException as e:
                 self.out_buffer.write("Invalid token: {}\n".format(token))
 
+        # Requests run concurrently, every token serves a few requests at a time
+        self.executor = ThreadPoolExecutor(max_workers=max_workers if max_workers else max(1, 4 * len(self.gh_api_list)), thread_name_prefix="github")
+
     def close(self):
+        self.executor.shutdown()
         for gh_api in self.gh_api_list:
-            self.out_buffer.write("GitHub user {} still has {}/{} requests\n"
-                                  .format(gh_api.get_user().login, gh_api.get_rate_limit().core.remaining, gh_api.get_rate_limit().core.limit))
+            self.rate_limits.observe(gh_api)
+            bucket = self.rate_limits.get_bucket(gh_api)
+            self.out_buffer.write("GitHub user {} still has {}/{} requests\n".format(bucket.login, bucket.remaining, bucket.limit))
 
     def waiting_for_reset(self, gh: Github) -> float:
-        core = gh.get_rate_limit().core
-        reset_utc_epoch = core.reset.timestamp()
+        bucket = self.rate_limits.get_bucket(gh)
+        reset_utc_epoch = bucket.reset
         current_utc_epoch = datetime.now().timestamp()
-        diff_utc_epoch = reset_utc_epoch - current_utc_epoch
+        diff_utc_epoch = max(0.0, reset_utc_epoch - current_utc_epoch)
 
-        token = self.token_map[gh.get_user().login]
         self.out_buffer.write("GitHub API, {}/{} rate-limit reached! User {} with token '{}' stops for {} seconds, restarts at {}\n".
-                              format(core.used, core.limit, gh.get_user().login, token, diff_utc_epoch, datetime.fromtimestamp(reset_utc_epoch)))
+                              format(bucket.limit - bucket.remaining, bucket.limit, bucket.login, bucket.token, diff_utc_epoch,
+                                     datetime.fromtimestamp(reset_utc_epoch)))
         pause.seconds(diff_utc_epoch)
+        self.rate_limits.refill(gh)
         return diff_utc_epoch
 
-    def get_github_api(self, min_requests: int) -> Github:
-        # Sort in descending order, consume many pending requests first
-        github_apis: list[Github] = sorted(self.gh_api_list, key=lambda x: x.get_rate_limit().core.remaining, reverse=True)
-
-        # If too few request are remaining, wait for reset time
-        while github_apis[0].get_rate_limit().core.remaining < min_requests:
-            # Sort in ascending order, smaller waiting time first
-            github_apis_waiting: list[Github] = sorted(self.gh_api_list, key=lambda x: x.get_rate_limit().core.reset.timestamp())
-            self.waiting_for_reset(github_apis_waiting[0])
-
-            # Sort in descending order, consume many pending requests first
-            github_apis: list[Github] = sorted(self.gh_api_list, key=lambda x: x.get_rate_limit().core.remaining, reverse=True)
+    def check_rate_limit(self, gh: Github, min_requests: int = 10) -> None:
+        self.rate_limits.observe(gh)
+        if self.rate_limits.get_bucket(gh).remaining < min_requests:
+            self.waiting_for_reset(gh)
 
-        # self.out_buffer.write("Using {} that has {}/{}\n".format(github_apis[0].get_user().login, github_apis[0].get_rate_limit().core.remaining,
-        #                                                          github_apis[0].get_rate_limit().core.limit))
-        return github_apis[0]
+    def get_github_api(self, min_requests: int) -> Github:
+        # Tokens and waits are chosen from the locally tracked rate-limits, no request is spent to check the quota
+        gh_api = self.rate_limits.acquire(min_requests)
+        while gh_api is None:
+            # Too few request are remaining, wait for the smaller reset time
+            self.waiting_for_reset(self.rate_limits.earliest_reset())
+            gh_api = self.rate_limits.acquire(min_requests)
+        return gh_api
+
+    def get_repo(self, gh_api: Github) -> Repository:
+        # One Repository handle per token and per run
+        gh_repo = self.repo_cache.get(gh_api)
+        if gh_repo is None:
+            gh_repo = gh_api.get_repo(self.name)
+            self.repo_cache[gh_api] = gh_repo
+        return gh_repo
 
     def get_repo_api(self, min_requests: int) -> Repository:
         gh_api = self.get_github_api(min_requests)
-        return gh_api.get_repo(self.name)
+        return self.get_repo(gh_api)
+
+    def get_user_details(self, user: NamedUser) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+        # Listings only carry the login, name and email cost one request per distinct user, not per pull, issue, or comment
+        if user is None:
+            return None, None, None
+        details = self.user_cache.get(user.login)
+        if details is None:
+            # Fetched on an acquired token, the lazy user of a listing would send it with the token of the listing
+            gh_api = self.get_github_api(10)
+            user = gh_api.get_user(user.login)
+            details = (user.login, user.name, user.email)
+            self.user_cache[user.login] = details
+        return details
 
     def get_repo_details(self, name: str) -> Dict[str, str]:
         self.name = name
+        # New repository, drop objects cached from the previous one
+        self.repo_cache = dict()
+        self.comment_cache = dict()
+        self.issue_cache = dict()
         gh_api = self.get_github_api(10)
 
-        repo_api = gh_api.get_repo(self.name)
+        repo_api = self.get_repo(gh_api)
         return {'name': self.name,
                 'language': repo_api.language,
                 'created_at': repo_api.created_at,
@@ -77,93 +185,157 @@ class GithubParallelTraversing:
 
     def get_pull_list(self, start: datetime, stop: datetime) -> List[int]:
         gh_api = self.get_github_api(10)
-        gh_repo = gh_api.get_repo(self.name)
+        gh_repo = self.get_repo(gh_api)
 
         pull_list: list[int] = []
-        for pull in gh_repo.get_pulls(state="all", sort="created"):
+        # Newest first, pages after the start of the window are never requested
+        for pull in gh_repo.get_pulls(state="all", sort="created", direction="desc"):
+            if pull.created_at < start:
+                break
 
-            if start <= pull.created_at <= stop:
+            if pull.created_at <= stop:
                 pull_list.append(pull.number)
 
             # Check for API rate limit
-            if gh_api.get_rate_limit().core.remaining < 10:
-                self.waiting_for_reset(gh_api)
+            self.check_rate_limit(gh_api)
 
         return pull_list
 
-    def get_pull_details(self, number: int) -> Dict[str, str]:
-        gh_api = self.get_github_api(10)
-        gh_repo = gh_api.get_repo(self.name)
-        pull = gh_repo.get_pull(number)
+    def get_pull(self, gh_api: Github, number: int) -> PullRequest:
+        # One request, every later request of the pull, e.g., commits and comments, is sent with the same token
+        return self.get_repo(gh_api).get_pull(number)
+
+    def _pull_details(self, pull: PullRequest) -> Dict[str, str]:
+        login, name, email = self.get_user_details(pull.user)
 
         return {'pull_number': pull.number, 'html_url': pull.html_url, 'branch': pull.head.ref,
                 'title': pull.title, 'body': pull.body, 'state': pull.state, 'merged': pull.merged,
                 'comment_count': pull.comments, 'commit_count': pull.commits, 'changed_file_count': pull.changed_files,
                 'total_addition_count': pull.additions, 'total_deletion_count': pull.deletions,
                 'created_at': pull.created_at, 'merged_at': pull.merged_at, 'closed_at': pull.closed_at, 'updated_at': pull.updated_at,
-                'created_by_login': pull.user.login, 'created_by_name': pull.user.name, 'created_by_email': pull.user.email,
+                'created_by_login': login, 'created_by_name': name, 'created_by_email': email,
                 'merge_commit': pull.merge_commit_sha, 'base_commit': pull.base.sha, 'head_commit': pull.head.sha}
 
-    def get_pull_commit_list(self, number: int) -> List[str]:
-        gh_api = self.get_github_api(10)
-        gh_repo = gh_api.get_repo(self.name)
-
+    def _pull_commit_list(self, gh_api: Github, pull: PullRequest) -> List[str]:
         commit_list: list[str] = []
-        for commit in gh_repo.get_pull(number).get_commits():
+        for commit in pull.get_commits():
             commit_list.append(commit.sha)
             # print("Login {}".format(commit.author.login))
 
             # Check for API rate limit
-            if gh_api.get_rate_limit().core.remaining < 10:
-                self.waiting_for_reset(gh_api)
+            self.check_rate_limit(gh_api)
 
         return commit_list
 
-    def get_pull_issue_list(self, number: int, start: datetime, stop: datetime) -> List[int]:
-        gh_api = self.get_github_api(10)
-        gh_repo = gh_api.get_repo(self.name)
-
+    def _pull_issue_list(self, gh_api: Github, pull: PullRequest, start: datetime, stop: datetime) -> List[int]:
         issue_list: list[int] = []
-        for issue in gh_repo.get_pull(number).get_issue_comments():
-            if start <= issue.created_at <= stop:
+        # Comments come oldest first, stop at the first one after the window
+        for issue in pull.get_issue_comments():
+            if issue.created_at > stop:
+                break
+            if start <= issue.created_at:
                 issue_list.append(issue.id)
+                # Keep the listing payload, details are built from it
+                self.comment_cache[issue.id] = issue
             # Check for API rate limit
-            if gh_api.get_rate_limit().core.remaining < 10:
-                self.waiting_for_reset(gh_api)
+            self.check_rate_limit(gh_api)
         return issue_list
 
-    def get_pull_issue_details(self, pl_number: int, issue_number: int) -> Dict[str, str]:
+    def get_pull_details(self, number: int) -> Dict[str, str]:
+        gh_api = self.get_github_api(10)
+        return self._pull_details(self.get_pull(gh_api, number))
+
+    def get_pull_commit_list(self, number: int) -> List[str]:
         gh_api = self.get_github_api(10)
-        gh_repo = gh_api.get_repo(self.name)
-        pull = gh_repo.get_pull(pl_number)
-        issue = pull.get_issue_comment(issue_number)
+        return self._pull_commit_list(gh_api, self.get_pull(gh_api, number))
+
+    def get_pull_issue_list(self, number: int, start: datetime, stop: datetime) -> List[int]:
+        gh_api = self.get_github_api(10)
+        return self._pull_issue_list(gh_api, self.get_pull(gh_api, number), start, stop)
+
+    def get_pull_issue_details(self, pl_number: int, issue_number: int) -> Dict[str, str]:
+        issue = self.comment_cache.get(issue_number)
+        if issue is None:
+            gh_api = self.get_github_api(10)
+            issue = self.get_pull(gh_api, pl_number).get_issue_comment(issue_number)
+        login, name, email = self.get_user_details(issue.user)
 
         return {'pull_issue_number': issue.id, 'html_url': issue.html_url,
                 'created_at': issue.created_at, 'updated_at': issue.updated_at,
-                'user_login': issue.user.login, 'user_name': issue.user.name, 'user_email': issue.user.email}
+                'user_login': login, 'user_name': name, 'user_email': email}
 
     def get_issue_list(self, start: datetime, stop: datetime) -> List[int]:
         gh_api = self.get_github_api(10)
-        gh_repo = gh_api.get_repo(self.name)
+        gh_repo = self.get_repo(gh_api)
 
         issue_list: list[int] = []
-        for issue in gh_repo.get_issues(state="all", sort="created"):
-            if start <= issue.created_at <= stop:
+        # Newest first, since drops the issues untouched after the start of the window, they cannot have been created within it
+        for issue in gh_repo.get_issues(state="all", sort="created", direction="desc", since=start):
+            if issue.created_at < start:
+                break
+
+            if issue.created_at <= stop:
                 issue_list.append(issue.number)
+                # Keep the listing payload, it already has every detail
+                self.issue_cache[issue.number] = issue
 
             # Check for API rate limit
-            if gh_api.get_rate_limit().core.remaining < 10:
-                self.waiting_for_reset(gh_api)
+            self.check_rate_limit(gh_api)
 
         return issue_list
 
     def get_issue_details(self, number: int) -> Dict[str, str]:
-        gh_api = self.get_github_api(10)
-        gh_repo = gh_api.get_repo(self.name)
-        issue = gh_repo.get_issue(number)
+        issue = self.issue_cache.get(number)
+        if issue is None:
+            gh_api = self.get_github_api(10)
+            issue = self.get_repo(gh_api).get_issue(number)
+        login, name, email = self.get_user_details(issue.user)
 
         return {'issue_number': issue.number, 'html_url': issue.html_url,
                 'title': issue.title, 'body': issue.body, 'state': issue.state,
                 'comment_count': issue.comments,
                 'created_at': issue.created_at, 'closed_at': issue.closed_at, 'updated_at': issue.updated_at,
-                'created_by_login': issue.user.login, 'created_by_name': issue.user.name, 'created_by_email': issue.user.email}
+                'created_by_login': login, 'created_by_name': name, 'created_by_email': email}
+
+    def get_pull_record(self, number: int, start: datetime, stop: datetime) -> Dict[str, str]:
+        # The pull is fetched once, its commits and comments are listed with the same token, the one charged for them
+        gh_api = self.get_github_api(10)
+        pull = self.get_pull(gh_api, number)
+        pull_details = self._pull_details(pull)
+
+        # Get all commit hashes of this pull requests
+        commit_list = self._pull_commit_list(gh_api, pull)
+        # Get all discussions of this pull requests
+        discussion_list = self._pull_issue_list(gh_api, pull, start, stop)
+
+        discussions_login: list[str] = []
+        discussions_name: list[str] = []
+        discussions_email: list[str] = []
+        for discussion_id in discussion_list:
+            discussion = self.get_pull_issue_details(number, discussion_id)
+            discussions_login.append(discussion["user_login"])
+            discussions_name.append(discussion["user_name"])
+            discussions_email.append(discussion["user_email"])
+
+        return {"commit_list": commit_list,
+                "comment_list_login": discussions_login,
+                "comment_list_name": discussions_name,
+                "comment_list_email": discussions_email,
+                } | pull_details
+
+    # Bulk methods run concurrently and yield results in the same order of numbers, as soon as the next one is available
+
+    def get_pull_details_many(self, numbers: List[int]) -> Iterator[Dict[str, str]]:
+        return self.executor.map(self.get_pull_details, numbers)
+
+    def get_pull_commit_list_many(self, numbers: List[int]) -> Iterator[List[str]]:
+        return self.executor.map(self.get_pull_commit_list, numbers)
+
+    def get_pull_issue_list_many(self, numbers: List[int], start: datetime, stop: datetime) -> Iterator[List[int]]:
+        return self.executor.map(lambda number: self.get_pull_issue_list(number, start, stop), numbers)
+
+    def get_pull_record_many(self, numbers: List[int], start: datetime, stop: datetime) -> Iterator[Dict[str, str]]:
+        return self.executor.map(lambda number: self.get_pull_record(number, start, stop), numbers)
+
+    def get_issue_details_many(self, numbers: List[int]) -> Iterator[Dict[str, str]]:
+        return self.executor.map(self.get_issue_details, numbers)
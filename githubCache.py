@@ -0,0 +1,185 @@
+import hashlib
+import json
+import time
+import requests
+import requests.adapters
+from threading import Lock
+from typing import Dict, Optional, Tuple
+from github.Requester import Requester, RequestsResponse
+from cache import SqliteLruCache
+
+# Response cache of the current process, see GithubResponseCache.install
+_response_cache = None
+
+
+class CachedResponse:
+    # Mimic the httplib response object as github.Requester.RequestsResponse
+    def __init__(self, status: int, headers: Dict[str, str], body: str):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    def getheaders(self):
+        return self.headers.items()
+
+    def read(self) -> str:
+        return self.body
+
+
+class GithubResponseCache:
+    # Never served from the cache, the rate-limit state must be current
+    UNCACHED_PATHS = ("/rate_limit",)
+    # Responses that depend on the token, the others are shared by all tokens
+    TOKEN_PATHS = ("/user",)
+
+    def __init__(self, filename: str, max_bytes: int, offline: bool = False):
+        self.storage = SqliteLruCache(filename, max_bytes)
+        self.offline = offline
+        self.revalidated = 0
+        self.stored = 0
+        self.lock = Lock()
+
+    def install(self) -> None:
+        global _response_cache
+        # Every Github instance of this process sends its requests through the cache
+        _response_cache = self
+        Requester.injectConnectionClasses(CachingHTTPConnection, CachingHTTPSConnection)
+
+    def key(self, url: str, headers: Dict[str, str]) -> str:
+        path = url.split("?", 1)[0]
+        key = "{} {}".format(headers.get("Accept", ""), url)
+        if path.startswith(self.TOKEN_PATHS):
+            authorization = headers.get("Authorization", "")
+            key = "{} {}".format(hashlib.sha256(authorization.encode()).hexdigest(), key)
+        return key
+
+    def cacheable(self, verb: str, url: str, stream: bool) -> bool:
+        return verb == "GET" and not stream and not url.split("?", 1)[0].endswith(self.UNCACHED_PATHS)
+
+    def get(self, key: str) -> Optional[Tuple[int, Dict[str, str], str]]:
+        value = self.storage.get(key)
+        if value is None:
+            return None
+        # JSON status and headers line followed by the body
+        meta, body = value.split(b"\n", 1)
+        meta = json.loads(meta)
+        return meta["status"], meta["headers"], body.decode("utf-8")
+
+    def put(self, key: str, status: int, headers: Dict[str, str], body: str) -> None:
+        meta = json.dumps({"status": status, "headers": headers}).encode("utf-8")
+        self.storage.put(key, meta + b"\n" + body.encode("utf-8"))
+        with self.lock:
+            self.stored += 1
+
+    @staticmethod
+    def validators(headers: Dict[str, str]) -> Dict[str, str]:
+        lower = {k.lower(): v for k, v in headers.items()}
+        conditions = dict()
+        if "etag" in lower:
+            conditions["If-None-Match"] = lower["etag"]
+        if "last-modified" in lower:
+            conditions["If-Modified-Since"] = lower["last-modified"]
+        return conditions
+
+    @staticmethod
+    def offline_headers(headers: Dict[str, str]) -> Dict[str, str]:
+        # Stored rate-limit headers are stale, offline requests are free
+        headers = {k: v for k, v in headers.items() if not k.lower().startswith("x-ratelimit-")}
+        headers["X-RateLimit-Limit"] = "5000"
+        headers["X-RateLimit-Remaining"] = "5000"
+        headers["X-RateLimit-Reset"] = str(int(time.time()) + 3600)
+        return headers
+
+    def stats(self) -> str:
+        return "{}, {} revalidated with 304, {} stored".format(self.storage.stats(), self.revalidated, self.stored)
+
+    def close(self) -> None:
+        global _response_cache
+        if _response_cache is self:
+            Requester.resetConnectionClasses()
+            _response_cache = None
+        self.storage.close()
+
+
+class CachingConnection:
+    protocol = None
+    default_port = None
+    # Injected classes are built for every request, sessions are shared to keep connections alive
+    sessions: Dict[Tuple[str, str, int], requests.Session] = dict()
+    sessions_lock = Lock()
+
+    # Mimic the httplib connection object as github.Requester.HTTPSRequestsConnectionClass
+    def __init__(self, host: str, port: Optional[int] = None, strict: bool = False, timeout: Optional[int] = None, retry=None,
+                 pool_size: Optional[int] = None, **kwargs):
+        self.host = host
+        self.port = port if port else self.default_port
+        self.timeout = timeout
+        self.verify = kwargs.get("verify", True)
+        with self.sessions_lock:
+            session_key = (self.protocol, host, self.port)
+            self.session = self.sessions.get(session_key)
+            if self.session is None:
+                self.session = requests.Session()
+                self.session.auth = Requester.noopAuth
+                pool_size = pool_size if pool_size else requests.adapters.DEFAULT_POOLSIZE
+                adapter = requests.adapters.HTTPAdapter(max_retries=retry if retry is not None else requests.adapters.DEFAULT_RETRIES,
+                                                        pool_connections=pool_size, pool_maxsize=pool_size)
+                self.session.mount(self.protocol + "://", adapter)
+                self.sessions[session_key] = self.session
+
+    def request(self, verb: str, url: str, input, headers: Dict[str, str], stream: bool = False) -> None:
+        self.verb = verb
+        self.url = url
+        self.input = input
+        self.headers = headers
+        self.stream = stream
+
+    def send(self, headers: Dict[str, str]):
+        verb = getattr(self.session, self.verb.lower())
+        url = "{}://{}:{}{}".format(self.protocol, self.host, self.port, self.url)
+        return verb(url, headers=headers, data=self.input, timeout=self.timeout, verify=self.verify, allow_redirects=False, stream=self.stream)
+
+    def getresponse(self):
+        cache = _response_cache
+        if cache is None or not cache.cacheable(self.verb, self.url, self.stream):
+            return RequestsResponse(self.send(self.headers))
+
+        key = cache.key(self.url, self.headers)
+        cached = cache.get(key)
+        if cache.offline:
+            if cached is None:
+                body = json.dumps({"message": "Not in the offline GitHub cache: {}".format(self.url)})
+                return CachedResponse(504, cache.offline_headers({"Content-Type": "application/json"}), body)
+            status, headers, body = cached
+            return CachedResponse(status, cache.offline_headers(headers), body)
+
+        headers = dict(self.headers)
+        if cached is not None:
+            headers.update(cache.validators(cached[1]))
+        response = self.send(headers)
+
+        if response.status_code == 304 and cached is not None:
+            # Not modified, the stored body is still valid and GitHub does not count the request against the rate limit
+            with cache.lock:
+                cache.revalidated += 1
+            status, stored_headers, body = cached
+            stored_headers.update(response.headers)
+            return CachedResponse(status, stored_headers, body)
+
+        if response.status_code == 200 and cache.validators(response.headers):
+            cache.put(key, response.status_code, dict(response.headers), response.text or "")
+        return RequestsResponse(response)
+
+    def close(self) -> None:
+        # The shared session outlives the connection
+        pass
+
+
+class CachingHTTPConnection(CachingConnection):
+    protocol = "http"
+    default_port = 80
+
+
+class CachingHTTPSConnection(CachingConnection):
+    protocol = "https"
+    default_port = 443
@@ -0,0 +1,338 @@
+import heapq
+import sys
+import github
+import pause
+import requests
+import requests.adapters
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from threading import Lock
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from urllib3.util.retry import Retry
+from githubAPI import RateLimitTracker
+
+# Cost and remaining points of every query, they drive the token choice as the X-RateLimit-* headers of the REST API
+RATE_LIMIT_FIELDS = "rateLimit { limit remaining resetAt }"
+AUTHOR_FIELDS = "author { __typename login ... on User { name email } }"
+
+VIEWER_QUERY = "query { viewer { login } " + RATE_LIMIT_FIELDS + " }"
+
+REPO_QUERY = """
+query($owner: String!, $name: String!) {
+  repository(owner: $owner, name: $name) {
+    nameWithOwner primaryLanguage { name } createdAt defaultBranchRef { name } description forkCount url
+  }
+  """ + RATE_LIMIT_FIELDS + """
+}"""
+
+# One page of pulls with their commits and comments, a pull needs further requests only when it has more than a page of them
+PULL_FIELDS = """
+number url headRefName title body state merged changedFiles additions deletions
+createdAt mergedAt closedAt updatedAt mergeCommit { oid } potentialMergeCommit { oid } baseRefOid headRefOid
+""" + AUTHOR_FIELDS + """
+commits(first: 100) { totalCount pageInfo { hasNextPage endCursor } nodes { commit { oid } } }
+comments(first: 100) { totalCount pageInfo { hasNextPage endCursor } nodes { databaseId url createdAt updatedAt """ + AUTHOR_FIELDS + """ } }
+"""
+
+PULLS_QUERY = """
+query($owner: String!, $name: String!, $size: Int!, $cursor: String) {
+  repository(owner: $owner, name: $name) {
+    pullRequests(first: $size, after: $cursor, orderBy: {field: CREATED_AT, direction: DESC}) {
+      pageInfo { hasNextPage endCursor }
+      nodes { """ + PULL_FIELDS + """ }
+    }
+  }
+  """ + RATE_LIMIT_FIELDS + """
+}"""
+
+PULL_COMMITS_QUERY = """
+query($owner: String!, $name: String!, $number: Int!, $cursor: String) {
+  repository(owner: $owner, name: $name) {
+    pullRequest(number: $number) {
+      commits(first: 100, after: $cursor) { pageInfo { hasNextPage endCursor } nodes { commit { oid } } }
+    }
+  }
+  """ + RATE_LIMIT_FIELDS + """
+}"""
+
+PULL_COMMENTS_QUERY = """
+query($owner: String!, $name: String!, $number: Int!, $cursor: String) {
+  repository(owner: $owner, name: $name) {
+    pullRequest(number: $number) {
+      comments(first: 100, after: $cursor) {
+        pageInfo { hasNextPage endCursor }
+        nodes { databaseId url createdAt updatedAt """ + AUTHOR_FIELDS + """ }
+      }
+    }
+  }
+  """ + RATE_LIMIT_FIELDS + """
+}"""
+
+ISSUE_FIELDS = "number url title body state createdAt closedAt updatedAt comments { totalCount } " + AUTHOR_FIELDS
+
+ISSUES_QUERY = """
+query($owner: String!, $name: String!, $size: Int!, $cursor: String) {
+  repository(owner: $owner, name: $name) {
+    issues(first: $size, after: $cursor, orderBy: {field: CREATED_AT, direction: DESC}) {
+      pageInfo { hasNextPage endCursor }
+      nodes { """ + ISSUE_FIELDS + """ }
+    }
+  }
+  """ + RATE_LIMIT_FIELDS + """
+}"""
+
+# Issues of a resumed run, their listing is in the journal but not in memory
+ISSUE_QUERY = """
+query($owner: String!, $name: String!, $number: Int!) {
+  repository(owner: $owner, name: $name) {
+    issueOrPullRequest(number: $number) { ... on Issue { """ + ISSUE_FIELDS + """ } ... on PullRequest { """ + ISSUE_FIELDS + """ } }
+  }
+  """ + RATE_LIMIT_FIELDS + """
+}"""
+
+
+class GraphQLRateLimitTracker(RateLimitTracker):
+    def observe(self, token: str) -> None:
+        # Nothing to read back, every response pushes its rateLimit field through update
+        pass
+
+
+class GithubGraphQLTraversing:
+    # Same interface and records of GithubParallelTraversing, pulls come in pages with their commits and comments
+    def __init__(self, tokens: List[str], out_buffer=sys.stdout, max_workers: Optional[int] = None, base_url: str = "https://api.github.com",
+                 page_size: int = 50):
+        self.out_buffer = out_buffer
+        self.name = None
+        self.owner = None
+        self.repo_name = None
+        self.page_size = page_size
+        # GitHub Enterprise serves REST under /api/v3 and GraphQL under /api/graphql
+        base_url = base_url.rstrip("/")
+        self.graphql_url = base_url[:-len("/v3")] + "/graphql" if base_url.endswith("/api/v3") else base_url + "/graphql"
+
+        # GitHub answers 502 when a query takes too long, try again
+        self.session = requests.Session()
+        retry = Retry(total=3, backoff_factor=1, status_forcelist=[502, 503, 504], allowed_methods=["POST"], raise_on_status=False)
+        self.session.mount("http://", requests.adapters.HTTPAdapter(max_retries=retry, pool_maxsize=32))
+        self.session.mount("https://", requests.adapters.HTTPAdapter(max_retries=retry, pool_maxsize=32))
+
+        # Pull and issue nodes of the current repository, see get_repo_details
+        self.pull_cache: dict[int, Dict[str, Any]] = dict()
+        self.issue_cache: dict[int, Dict[str, Any]] = dict()
+        self.pull_window: Optional[Tuple[datetime, datetime]] = None
+        self.pull_numbers: list[int] = []
+        self.cache_lock = Lock()
+
+        self.rate_limits = GraphQLRateLimitTracker()
+        self.token_list: list[str] = []
+        for token in tokens:
+            try:
+                self.rate_limits.add(token, "", token)
+                data = self.query(VIEWER_QUERY, {}, token)
+                login = data["viewer"]["login"]
+                bucket = self.rate_limits.get_bucket(token)
+                bucket.login = login
+                self.out_buffer.write("GitHub user {} has {} GraphQL points per hour, used {}\n".format(login, bucket.limit, bucket.limit - bucket.remaining))
+                self.token_list.append(token)
+            except github.GithubException:
+                del self.rate_limits.buckets[token]
+                self.out_buffer.write("Invalid token: {}\n".format(token))
+
+        # Only pulls with more than a page of commits or comments need further queries, a couple of them per token is enough
+        self.executor = ThreadPoolExecutor(max_workers=max_workers if max_workers else max(1, 2 * len(self.token_list)), thread_name_prefix="graphql")
+
+    def close(self):
+        self.executor.shutdown()
+        self.session.close()
+        for token in self.token_list:
+            bucket = self.rate_limits.get_bucket(token)
+            self.out_buffer.write("GitHub user {} still has {}/{} GraphQL points\n".format(bucket.login, bucket.remaining, bucket.limit))
+
+    def waiting_for_reset(self, token: str) -> float:
+        bucket = self.rate_limits.get_bucket(token)
+        diff_utc_epoch = max(0.0, bucket.reset - datetime.now().timestamp())
+        self.out_buffer.write("GitHub GraphQL API, {}/{} rate-limit reached! User {} stops for {} seconds, restarts at {}\n".
+                              format(bucket.limit - bucket.remaining, bucket.limit, bucket.login, diff_utc_epoch, datetime.fromtimestamp(bucket.reset)))
+        pause.seconds(diff_utc_epoch)
+        self.rate_limits.refill(token)
+        return diff_utc_epoch
+
+    def get_token(self, min_points: int) -> str:
+        token = self.rate_limits.acquire(min_points)
+        while token is None:
+            self.waiting_for_reset(self.rate_limits.earliest_reset())
+            token = self.rate_limits.acquire(min_points)
+        return token
+
+    def query(self, query: str, variables: Dict[str, Any], token: Optional[str] = None) -> Dict[str, Any]:
+        if token is None:
+            token = self.get_token(10)
+        response = self.session.post(self.graphql_url, json={"query": query, "variables": variables},
+                                     headers={"Authorization": "bearer {}".format(token)})
+        payload = response.json() if response.content else None
+        if response.status_code != 200 or payload is None or payload.get("errors"):
+            raise github.GithubException(response.status_code, payload, dict(response.headers))
+
+        rate_limit = payload["data"].get("rateLimit")
+        if rate_limit is not None:
+            reset = int(self.parse_date(rate_limit["resetAt"]).timestamp())
+            self.rate_limits.update(token, rate_limit["remaining"], rate_limit["limit"], reset)
+        return payload["data"]
+
+    @staticmethod
+    def parse_date(value: Optional[str]) -> Optional[datetime]:
+        # Aware UTC datetimes, as PyGithub returns them. fromisoformat only accepts the "Z" suffix since Python 3.11
+        return datetime.fromisoformat(value.replace("Z", "+00:00")) if value else None
+
+    @staticmethod
+    def parse_author(author: Optional[Dict[str, Any]]) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+        # Deleted accounts have no author, bots show their REST login, and REST reports missing names and private emails as None
+        if author is None:
+            return None, None, None
+        login = author["login"] + "[bot]" if author["__typename"] == "Bot" else author["login"]
+        return login, author.get("name") or None, author.get("email") or None
+
+    @staticmethod
+    def parse_state(state: str) -> str:
+        # REST knows open and closed only, a merged pull is closed
+        return "closed" if state == "MERGED" else state.lower()
+
+    def variables(self, **kwargs) -> Dict[str, Any]:
+        return {"owner": self.owner, "name": self.repo_name} | kwargs
+
+    def get_repo_details(self, name: str) -> Dict[str, str]:
+        self.name = name
+        self.owner, self.repo_name = name.split("/", 1)
+        # New repository, drop nodes fetched for the previous one
+        with self.cache_lock:
+            self.pull_cache = dict()
+            self.issue_cache = dict()
+            self.pull_window = None
+            self.pull_numbers = []
+
+        repo = self.query(REPO_QUERY, self.variables())["repository"]
+        return {'name': self.name,
+                'language': repo["primaryLanguage"]["name"] if repo["primaryLanguage"] else None,
+                'created_at': self.parse_date(repo["createdAt"]),
+                'default_branch': repo["defaultBranchRef"]["name"] if repo["defaultBranchRef"] else None,
+                'description': repo["description"],
+                'fork_count': repo["forkCount"],
+                'url': repo["url"]}
+
+    def iterate_window(self, query: str, connection: str, start: datetime, stop: datetime) -> Iterator[Dict[str, Any]]:
+        # Newest first, stop paging at the first node created before the window
+        cursor = None
+        while True:
+            data = self.query(query, self.variables(size=self.page_size, cursor=cursor))["repository"][connection]
+            for node in data["nodes"]:
+                created_at = self.parse_date(node["createdAt"])
+                if created_at < start:
+                    return
+                if created_at <= stop:
+                    yield node
+            if not data["pageInfo"]["hasNextPage"]:
+                return
+            cursor = data["pageInfo"]["endCursor"]
+
+    def get_pull_list(self, start: datetime, stop: datetime) -> List[int]:
+        if self.pull_window == (start, stop):
+            return list(self.pull_numbers)
+
+        pull_numbers: list[int] = []
+        for node in self.iterate_window(PULLS_QUERY, "pullRequests", start, stop):
+            self.pull_cache[node["number"]] = node
+            pull_numbers.append(node["number"])
+        self.pull_window = (start, stop)
+        self.pull_numbers = pull_numbers
+        return list(pull_numbers)
+
+    def get_pull_node(self, number: int, start: datetime, stop: datetime) -> Dict[str, Any]:
+        node = self.pull_cache.get(number)
+        if node is None:
+            # Resumed run, the listing of the previous one is in the journal but not in memory
+            with self.cache_lock:
+                if self.pull_window != (start, stop):
+                    self.get_pull_list(start, stop)
+            node = self.pull_cache[number]
+        return node
+
+    def get_pull_connection(self, query: str, connection: str, number: int, first_page: Dict[str, Any]) -> List[Dict[str, Any]]:
+        nodes = list(first_page["nodes"])
+        page_info = first_page["pageInfo"]
+        while page_info["hasNextPage"]:
+            data = self.query(query, self.variables(number=number, cursor=page_info["endCursor"]))
+            page = data["repository"]["pullRequest"][connection]
+            nodes.extend(page["nodes"])
+            page_info = page["pageInfo"]
+        return nodes
+
+    def get_pull_details(self, number: int, start: datetime, stop: datetime) -> Dict[str, str]:
+        node = self.get_pull_node(number, start, stop)
+        login, name, email = self.parse_author(node["author"])
+        # REST merge_commit_sha is the test merge commit of a pull that is not merged, GraphQL tells it apart from the merge commit
+        merge_commit = node["mergeCommit"] or node["potentialMergeCommit"]
+
+        return {'pull_number': node["number"], 'html_url': node["url"], 'branch': node["headRefName"],
+                'title': node["title"], 'body': node["body"], 'state': self.parse_state(node["state"]), 'merged': node["merged"],
+                'comment_count': node["comments"]["totalCount"], 'commit_count': node["commits"]["totalCount"],
+                'changed_file_count': node["changedFiles"], 'total_addition_count': node["additions"], 'total_deletion_count': node["deletions"],
+                'created_at': self.parse_date(node["createdAt"]), 'merged_at': self.parse_date(node["mergedAt"]),
+                'closed_at': self.parse_date(node["closedAt"]), 'updated_at': self.parse_date(node["updatedAt"]),
+                'created_by_login': login, 'created_by_name': name, 'created_by_email': email,
+                'merge_commit': merge_commit["oid"] if merge_commit else None, 'base_commit': node["baseRefOid"],
+                'head_commit': node["headRefOid"]}
+
+    def get_pull_record(self, number: int, start: datetime, stop: datetime) -> Dict[str, str]:
+        pull_details = self.get_pull_details(number, start, stop)
+        node = self.get_pull_node(number, start, stop)
+
+        commits = self.get_pull_connection(PULL_COMMITS_QUERY, "commits", number, node["commits"])
+        comments = self.get_pull_connection(PULL_COMMENTS_QUERY, "comments", number, node["comments"])
+
+        discussions_login: list[str] = []
+        discussions_name: list[str] = []
+        discussions_email: list[str] = []
+        for comment in comments:
+            if start <= self.parse_date(comment["createdAt"]) <= stop:
+                login, name, email = self.parse_author(comment["author"])
+                discussions_login.append(login)
+                discussions_name.append(name)
+                discussions_email.append(email)
+
+        return {"commit_list": [commit["commit"]["oid"] for commit in commits],
+                "comment_list_login": discussions_login,
+                "comment_list_name": discussions_name,
+                "comment_list_email": discussions_email,
+                } | pull_details
+
+    def get_pull_record_many(self, numbers: List[int], start: datetime, stop: datetime) -> Iterator[Dict[str, str]]:
+        return self.executor.map(lambda number: self.get_pull_record(number, start, stop), numbers)
+
+    def get_issue_list(self, start: datetime, stop: datetime) -> List[int]:
+        # REST lists pulls among the issues, merge both connections newest first as the REST listing does
+        self.get_pull_list(start, stop)
+        issues = self.iterate_window(ISSUES_QUERY, "issues", start, stop)
+        pulls = (self.pull_cache[number] for number in self.pull_numbers)
+
+        issue_numbers: list[int] = []
+        for node in heapq.merge(issues, pulls, key=lambda x: (x["createdAt"], x["number"]), reverse=True):
+            self.issue_cache[node["number"]] = node
+            issue_numbers.append(node["number"])
+        return issue_numbers
+
+    def get_issue_details(self, number: int) -> Dict[str, str]:
+        node = self.issue_cache.get(number)
+        if node is None:
+            node = self.query(ISSUE_QUERY, self.variables(number=number))["repository"]["issueOrPullRequest"]
+        login, name, email = self.parse_author(node["author"])
+
+        return {'issue_number': node["number"], 'html_url': node["url"],
+                'title': node["title"], 'body': node["body"], 'state': self.parse_state(node["state"]),
+                'comment_count': node["comments"]["totalCount"],
+                'created_at': self.parse_date(node["createdAt"]), 'closed_at': self.parse_date(node["closedAt"]),
+                'updated_at': self.parse_date(node["updatedAt"]),
+                'created_by_login': login, 'created_by_name': name, 'created_by_email': email}
+
+    def get_issue_details_many(self, numbers: List[int]) -> Iterator[Dict[str, str]]:
+        # Listed issues come with their page, nothing to fetch
+        return self.executor.map(self.get_issue_details, numbers)
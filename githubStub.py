@@ -0,0 +1,442 @@
+import hashlib
+import json
+import re
+import threading
+import time
+import requests
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+
+class SyntheticRepository:
+    # Deterministic repository: pulls and issues share the numbers, they alternate until one of them runs out
+    def __init__(self, owner: str = "apache", name: str = "project", pull_count: int = 1000, issue_count: int = 1000, commits_per_pull: int = 3,
+                 comments_per_pull: int = 3, user_count: int = 100, start: datetime = datetime(2015, 1, 1, tzinfo=timezone.utc)):
+        self.owner = owner
+        self.name = name
+        self.full_name = owner + "/" + name
+        self.commits_per_pull = commits_per_pull
+        self.comments_per_pull = comments_per_pull
+        self.user_count = max(1, user_count)
+        self.start = start
+
+        self.pulls: set[int] = set()
+        pulls_left, issues_left = pull_count, issue_count
+        for number in range(1, pull_count + issue_count + 1):
+            if pulls_left > 0 and (number % 2 == 1 or issues_left == 0):
+                self.pulls.add(number)
+                pulls_left -= 1
+            else:
+                issues_left -= 1
+        self.numbers = list(range(1, pull_count + issue_count + 1))
+
+    def created_at(self, number: int) -> datetime:
+        return self.start + timedelta(hours=number)
+
+    def updated_at(self, number: int) -> datetime:
+        return self.created_at(number) + timedelta(days=1)
+
+    def author(self, number: int) -> str:
+        return "user{}".format(number % self.user_count)
+
+    def comment_ids(self, number: int) -> List[int]:
+        return [number * 1000 + index for index in range(self.comments_per_pull)]
+
+    def commit_shas(self, number: int) -> List[str]:
+        return [hashlib.sha1("{}:{}".format(number, index).encode()).hexdigest() for index in range(self.commits_per_pull)]
+
+
+def iso(date: Optional[datetime]) -> Optional[str]:
+    return date.strftime("%Y-%m-%dT%H:%M:%SZ") if date else None
+
+
+class RestPayloads:
+    # REST documents with the fields PyGithub reads, URLs point back to the stub
+    def __init__(self, repo: SyntheticRepository, base_url: str):
+        self.repo = repo
+        self.base_url = base_url
+        self.repo_url = "{}/repos/{}".format(base_url, repo.full_name)
+
+    def user(self, login: str, full: bool = False) -> Dict[str, Any]:
+        user = {"login": login, "id": abs(hash(login)) % 10 ** 8, "type": "User", "url": "{}/users/{}".format(self.base_url, login)}
+        if full:
+            user |= {"name": login.capitalize(), "email": "{}@example.org".format(login)}
+        return user
+
+    def repository(self) -> Dict[str, Any]:
+        return {"id": 1, "name": self.repo.name, "full_name": self.repo.full_name, "owner": self.user(self.repo.owner), "language": "Java",
+                "created_at": iso(self.repo.start), "default_branch": "master", "description": "Synthetic repository", "forks": 42,
+                "forks_count": 42, "html_url": "https://github.com/{}".format(self.repo.full_name), "url": self.repo_url}
+
+    def pull(self, number: int, full: bool = False) -> Dict[str, Any]:
+        merged = number % 3 != 0
+        closed_at = iso(self.repo.updated_at(number)) if number % 5 != 0 else None
+        pull = {"id": number, "number": number, "url": "{}/pulls/{}".format(self.repo_url, number),
+                "html_url": "https://github.com/{}/pull/{}".format(self.repo.full_name, number),
+                "issue_url": "{}/issues/{}".format(self.repo_url, number), "title": "Pull {}".format(number), "body": "Body of pull {}".format(number),
+                "state": "closed" if closed_at else "open", "created_at": iso(self.repo.created_at(number)),
+                "updated_at": iso(self.repo.updated_at(number)), "closed_at": closed_at, "merged_at": closed_at if merged else None,
+                "merge_commit_sha": self.repo.commit_shas(number)[-1] if self.repo.commits_per_pull else None, "user": self.user(self.repo.author(number)),
+                "head": {"ref": "branch-{}".format(number), "sha": "{:040x}".format(number)}, "base": {"ref": "master", "sha": "{:040x}".format(number - 1)}}
+        if full:
+            pull |= {"merged": merged and closed_at is not None, "comments": self.repo.comments_per_pull, "commits": self.repo.commits_per_pull,
+                     "changed_files": number % 7 + 1, "additions": number % 100, "deletions": number % 50}
+        return pull
+
+    def commit(self, sha: str) -> Dict[str, Any]:
+        return {"sha": sha, "url": "{}/commits/{}".format(self.repo_url, sha)}
+
+    def comment(self, comment_id: int) -> Dict[str, Any]:
+        number = comment_id // 1000
+        created_at = self.repo.created_at(number) + timedelta(minutes=comment_id % 1000)
+        return {"id": comment_id, "url": "{}/issues/comments/{}".format(self.repo_url, comment_id),
+                "html_url": "https://github.com/{}/pull/{}#issuecomment-{}".format(self.repo.full_name, number, comment_id),
+                "created_at": iso(created_at), "updated_at": iso(created_at), "user": self.user(self.repo.author(comment_id)), "body": "Comment"}
+
+    def issue(self, number: int) -> Dict[str, Any]:
+        kind = "pull" if number in self.repo.pulls else "issues"
+        closed_at = iso(self.repo.updated_at(number)) if number % 5 != 0 else None
+        issue = {"id": number, "number": number, "url": "{}/issues/{}".format(self.repo_url, number),
+                 "html_url": "https://github.com/{}/{}/{}".format(self.repo.full_name, kind, number),
+                 # A pull and its issue share the title and the body
+                 "title": "{} {}".format("Pull" if kind == "pull" else "Issue", number),
+                 "body": "Body of {} {}".format("pull" if kind == "pull" else "issue", number), "state": "closed" if closed_at else "open",
+                 "comments": self.repo.comments_per_pull if number in self.repo.pulls else 0, "created_at": iso(self.repo.created_at(number)),
+                 "updated_at": iso(self.repo.updated_at(number)), "closed_at": closed_at, "user": self.user(self.repo.author(number))}
+        if number in self.repo.pulls:
+            issue["pull_request"] = {"url": "{}/pulls/{}".format(self.repo_url, number)}
+        return issue
+
+
+class GraphQLPayloads:
+    # Answers the queries of githubGraphQL, told apart by the connection they page through
+    def __init__(self, repo: SyntheticRepository, rest: RestPayloads):
+        self.repo = repo
+        self.rest = rest
+
+    @staticmethod
+    def author(user: Dict[str, Any]) -> Dict[str, Any]:
+        return {"__typename": "User", "login": user["login"], "name": user.get("name"), "email": user.get("email", "")}
+
+    @staticmethod
+    def page(items: List[Any], size: int, cursor: Optional[str]) -> Tuple[List[Any], Dict[str, Any]]:
+        offset = int(cursor) if cursor else 0
+        end = offset + size
+        return items[offset:end], {"hasNextPage": end < len(items), "endCursor": str(end)}
+
+    def commits(self, number: int, cursor: Optional[str]) -> Dict[str, Any]:
+        nodes, page_info = self.page(self.repo.commit_shas(number), 100, cursor)
+        return {"totalCount": self.repo.commits_per_pull, "pageInfo": page_info, "nodes": [{"commit": {"oid": sha}} for sha in nodes]}
+
+    def comments(self, number: int, cursor: Optional[str]) -> Dict[str, Any]:
+        nodes, page_info = self.page(self.repo.comment_ids(number), 100, cursor)
+        comments = []
+        for comment_id in nodes:
+            comment = self.rest.comment(comment_id)
+            comments.append({"databaseId": comment_id, "url": comment["html_url"], "createdAt": comment["created_at"], "updatedAt": comment["updated_at"],
+                             "author": self.author(self.rest.user(comment["user"]["login"], full=True))})
+        return {"totalCount": self.repo.comments_per_pull, "pageInfo": page_info, "nodes": comments}
+
+    def issue(self, number: int) -> Dict[str, Any]:
+        issue = self.rest.issue(number)
+        return {"number": number, "url": issue["html_url"], "title": issue["title"], "body": issue["body"], "state": issue["state"].upper(),
+                "createdAt": issue["created_at"], "closedAt": issue["closed_at"], "updatedAt": issue["updated_at"],
+                "comments": {"totalCount": issue["comments"]}, "author": self.author(self.rest.user(issue["user"]["login"], full=True))}
+
+    def pull(self, number: int) -> Dict[str, Any]:
+        pull = self.rest.pull(number, full=True)
+        state = "MERGED" if pull["merged"] else pull["state"].upper()
+        return {"number": number, "url": pull["html_url"], "headRefName": pull["head"]["ref"], "title": pull["title"], "body": pull["body"],
+                "state": state, "merged": pull["merged"], "changedFiles": pull["changed_files"], "additions": pull["additions"],
+                "deletions": pull["deletions"], "createdAt": pull["created_at"], "mergedAt": pull["merged_at"], "closedAt": pull["closed_at"],
+                "updatedAt": pull["updated_at"], "mergeCommit": {"oid": pull["merge_commit_sha"]} if pull["merged"] else None,
+                "potentialMergeCommit": {"oid": pull["merge_commit_sha"]} if not pull["merged"] and pull["merge_commit_sha"] else None,
+                "baseRefOid": pull["base"]["sha"], "headRefOid": pull["head"]["sha"],
+                "author": self.author(self.rest.user(pull["user"]["login"], full=True)),
+                "commits": self.commits(number, None), "comments": self.comments(number, None)}
+
+    def answer(self, query: str, variables: Dict[str, Any]) -> Tuple[Dict[str, Any], int]:
+        # Data and cost in points, one point per query as GitHub charges small queries
+        newest_first = sorted(self.repo.numbers, reverse=True)
+        if "viewer" in query:
+            return {"viewer": {"login": "stub"}}, 1
+        if "pullRequests(" in query:
+            numbers, page_info = self.page([n for n in newest_first if n in self.repo.pulls], variables["size"], variables.get("cursor"))
+            return {"repository": {"pullRequests": {"pageInfo": page_info, "nodes": [self.pull(n) for n in numbers]}}}, 1
+        if "issues(" in query:
+            numbers, page_info = self.page([n for n in newest_first if n not in self.repo.pulls], variables["size"], variables.get("cursor"))
+            return {"repository": {"issues": {"pageInfo": page_info, "nodes": [self.issue(n) for n in numbers]}}}, 1
+        if "issueOrPullRequest" in query:
+            return {"repository": {"issueOrPullRequest": self.issue(variables["number"])}}, 1
+        if "commits(first: 100, after" in query:
+            return {"repository": {"pullRequest": {"commits": self.commits(variables["number"], variables.get("cursor"))}}}, 1
+        if "comments(first: 100, after" in query:
+            return {"repository": {"pullRequest": {"comments": self.comments(variables["number"], variables.get("cursor"))}}}, 1
+        rest = self.rest.repository()
+        return {"repository": {"nameWithOwner": rest["full_name"], "primaryLanguage": {"name": rest["language"]}, "createdAt": rest["created_at"],
+                               "defaultBranchRef": {"name": rest["default_branch"]}, "description": rest["description"],
+                               "forkCount": rest["forks"], "url": rest["html_url"]}}, 1
+
+
+class StubState:
+    def __init__(self, repo: Optional[SyntheticRepository], latency: float, rate_limit: int, rate_window: int,
+                 replay: Optional[Dict[str, Any]] = None, upstream: Optional[str] = None):
+        self.repo = repo
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self.replay = replay
+        self.upstream = upstream.rstrip("/") if upstream else None
+        self.recorded: dict[str, Any] = dict()
+        self.lock = threading.Lock()
+        self.requests: Counter = Counter()
+        self.not_modified = 0
+        self.rate_limited = 0
+        # Remaining requests and reset epoch of every token
+        self.windows: dict[str, Tuple[int, int]] = dict()
+        self.base_url = None
+        self.rest: Optional[RestPayloads] = None
+        self.graphql: Optional[GraphQLPayloads] = None
+
+    def spend(self, token: str, cost: int) -> Tuple[bool, int, int]:
+        # GitHub does not charge 304 answers, callers pass a zero cost for them
+        with self.lock:
+            now = int(time.time())
+            remaining, reset = self.windows.get(token, (self.rate_limit, now + self.rate_window))
+            if now >= reset:
+                remaining, reset = self.rate_limit, now + self.rate_window
+            allowed = remaining >= cost
+            if allowed:
+                remaining -= cost
+            else:
+                self.rate_limited += 1
+            self.windows[token] = (remaining, reset)
+            return allowed, remaining, reset
+
+    def total_requests(self) -> int:
+        with self.lock:
+            return sum(self.requests.values())
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body leave in separate writes, Nagle and delayed ACKs would add tens of milliseconds to every response
+    disable_nagle_algorithm = True
+    state: StubState = None
+
+    ROUTES = [("repo", re.compile(r"^/repos/[^/]+/[^/]+$")),
+              ("pulls", re.compile(r"^/repos/[^/]+/[^/]+/pulls$")),
+              ("pull", re.compile(r"^/repos/[^/]+/[^/]+/pulls/(\d+)$")),
+              ("pull_commits", re.compile(r"^/repos/[^/]+/[^/]+/pulls/(\d+)/commits$")),
+              ("issues", re.compile(r"^/repos/[^/]+/[^/]+/issues$")),
+              ("issue", re.compile(r"^/repos/[^/]+/[^/]+/issues/(\d+)$")),
+              ("issue_comments", re.compile(r"^/repos/[^/]+/[^/]+/issues/(\d+)/comments$")),
+              ("comment", re.compile(r"^/repos/[^/]+/[^/]+/issues/comments/(\d+)$")),
+              ("named_user", re.compile(r"^/users/([^/]+)$")),
+              ("user", re.compile(r"^/user$")),
+              ("rate_limit", re.compile(r"^/rate_limit$"))]
+
+    # Placeholder of the stub address in recordings
+    BASE_URL = "{{base_url}}"
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def token(self) -> str:
+        return self.headers.get("Authorization", "anonymous").split(" ")[-1]
+
+    def send(self, status: int, body: Any, headers: Optional[Dict[str, str]] = None, cost: int = 1) -> None:
+        state = self.state
+        data = body if isinstance(body, bytes) else json.dumps(body).encode()
+        etag = '"{}"'.format(hashlib.sha1(data).hexdigest())
+        if status == 200 and self.command == "GET" and self.headers.get("If-None-Match") == etag:
+            status, data, cost = 304, b"", 0
+            with state.lock:
+                state.not_modified += 1
+
+        allowed, remaining, reset = state.spend(self.token(), cost)
+        if not allowed:
+            status, etag = 403, None
+            data = json.dumps({"message": "API rate limit exceeded", "documentation_url": "https://docs.github.com/rest"}).encode()
+
+        if state.latency > 0:
+            time.sleep(state.latency)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("X-RateLimit-Limit", str(state.rate_limit))
+        self.send_header("X-RateLimit-Remaining", str(remaining))
+        self.send_header("X-RateLimit-Reset", str(reset))
+        if etag:
+            self.send_header("ETag", etag)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def paginate(self, url, items: List[Any]) -> None:
+        query = parse_qs(url.query)
+        per_page = int(query.get("per_page", ["30"])[0])
+        page = int(query.get("page", ["1"])[0])
+        headers = dict()
+        if page * per_page < len(items):
+            query["page"] = [str(page + 1)]
+            query["per_page"] = [str(per_page)]
+            next_url = "http://{}{}?{}".format(self.headers.get("Host"), url.path, "&".join("{}={}".format(k, v[0]) for k, v in query.items()))
+            headers["Link"] = '<{}>; rel="next"'.format(next_url)
+        self.send(200, items[(page - 1) * per_page:page * per_page], headers)
+
+    def do_GET(self) -> None:
+        url = urlparse(self.path)
+        if self.state.replay is not None or self.state.upstream is not None:
+            return self.forward(url, None)
+        rest = self.state.rest
+        repo = self.state.repo
+        for route, pattern in self.ROUTES:
+            match = pattern.match(url.path)
+            if match is None:
+                continue
+            with self.state.lock:
+                self.state.requests[route] += 1
+            query = parse_qs(url.query)
+            newest_first = sorted(repo.numbers, reverse=True)
+            if route == "repo":
+                return self.send(200, rest.repository())
+            if route == "pulls":
+                return self.paginate(url, [rest.pull(n) for n in newest_first if n in repo.pulls])
+            if route == "pull":
+                return self.send(200, rest.pull(int(match.group(1)), full=True))
+            if route == "pull_commits":
+                return self.paginate(url, [rest.commit(sha) for sha in repo.commit_shas(int(match.group(1)))])
+            if route == "issues":
+                since = query.get("since", [None])[0]
+                since = datetime.fromisoformat(since.replace("Z", "+00:00")) if since else None
+                numbers = [n for n in newest_first if since is None or repo.updated_at(n) >= since]
+                return self.paginate(url, [rest.issue(n) for n in numbers])
+            if route == "issue":
+                return self.send(200, rest.issue(int(match.group(1))))
+            if route == "issue_comments":
+                number = int(match.group(1))
+                comment_ids = repo.comment_ids(number) if number in repo.pulls else []
+                return self.paginate(url, [rest.comment(comment_id) for comment_id in comment_ids])
+            if route == "comment":
+                return self.send(200, rest.comment(int(match.group(1))))
+            if route == "named_user":
+                return self.send(200, rest.user(match.group(1), full=True))
+            if route == "user":
+                return self.send(200, rest.user("stub", full=True))
+            if route == "rate_limit":
+                remaining, reset = self.state.windows.get(self.token(), (self.state.rate_limit, int(time.time()) + self.state.rate_window))
+                core = {"limit": self.state.rate_limit, "remaining": remaining, "reset": reset, "used": self.state.rate_limit - remaining}
+                return self.send(200, {"resources": {"core": core, "graphql": core}, "rate": core}, cost=0)
+        with self.state.lock:
+            self.state.requests["unknown"] += 1
+        self.send(404, {"message": "Not Found"})
+
+    def do_POST(self) -> None:
+        url = urlparse(self.path)
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.state.replay is not None or self.state.upstream is not None:
+            return self.forward(url, body)
+        if not url.path.endswith("/graphql"):
+            return self.send(404, {"message": "Not Found"})
+        with self.state.lock:
+            self.state.requests["graphql"] += 1
+        request = json.loads(body)
+        data, cost = self.state.graphql.answer(request["query"], request.get("variables") or {})
+        allowed, remaining, reset = self.state.spend(self.token(), 0)
+        data["rateLimit"] = {"limit": self.state.rate_limit, "remaining": max(0, remaining - cost), "resetAt": iso(datetime.fromtimestamp(reset, timezone.utc))}
+        self.send(200, {"data": data}, cost=cost)
+
+    @staticmethod
+    def record_key(method: str, url, body: Optional[bytes]) -> str:
+        # Tokens are not part of the key, a recording replays with any of them
+        key = "{} {}".format(method, url.path + ("?" + url.query if url.query else ""))
+        if body:
+            key += " " + hashlib.sha256(body).hexdigest()
+        return key
+
+    def forward(self, url, body: Optional[bytes]) -> None:
+        state = self.state
+        key = self.record_key(self.command, url, body)
+        with state.lock:
+            state.requests["replay" if state.replay is not None else "record"] += 1
+        if state.replay is not None:
+            recorded = state.replay.get(key)
+            if recorded is None:
+                return self.send(404, {"message": "Not recorded: {}".format(key)})
+            return self.send(recorded["status"], self.relocate(recorded["body"]).encode(),
+                             {k: self.relocate(v) for k, v in recorded["headers"].items()})
+
+        headers = {k: v for k, v in self.headers.items() if k.lower() in ("authorization", "accept", "content-type")}
+        response = requests.request(self.command, state.upstream + self.path, headers=headers, data=body, allow_redirects=False)
+        # PyGithub follows pagination links on the host and port it talks to, the recording must not tie them to the upstream
+        kept = {k: v.replace(state.upstream, self.BASE_URL) for k, v in response.headers.items() if k.lower() == "link"}
+        recorded_body = response.text.replace(state.upstream, self.BASE_URL)
+        with state.lock:
+            state.recorded[key] = {"status": response.status_code, "headers": kept, "body": recorded_body}
+        self.send(response.status_code, self.relocate(recorded_body).encode(), {k: self.relocate(v) for k, v in kept.items()})
+
+    def relocate(self, text: str) -> str:
+        return text.replace(self.BASE_URL, self.state.base_url)
+
+
+class GithubStubServer:
+    # Local stand-in of the GitHub REST and GraphQL APIs: synthetic data, a replayed recording, or a recording proxy to the real API
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, repo: Optional[SyntheticRepository] = None, latency: float = 0.0,
+                 rate_limit: int = 5000, rate_window: int = 3600, replay_file: Optional[str] = None, upstream: Optional[str] = None):
+        replay = None
+        if replay_file is not None and upstream is None:
+            with open(replay_file, "r") as f:
+                replay = json.load(f)
+        self.record_file = replay_file if upstream is not None else None
+        self.state = StubState(repo if repo is not None else SyntheticRepository(), latency, rate_limit, rate_window, replay, upstream)
+
+        handler = type("BoundStubHandler", (StubHandler,), {"state": self.state})
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+        self.base_url = "http://{}:{}".format(host, self.server.server_port)
+        self.state.base_url = self.base_url
+        self.state.rest = RestPayloads(self.state.repo, self.base_url)
+        self.state.graphql = GraphQLPayloads(self.state.repo, self.state.rest)
+        self.thread = None
+
+    def start(self) -> "GithubStubServer":
+        self.thread = threading.Thread(target=self.server.serve_forever, name="github-stub", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        if self.record_file is not None:
+            with open(self.record_file, "w") as f:
+                json.dump(self.state.recorded, f)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Local stand-in of the GitHub REST and GraphQL APIs")
+    parser.add_argument("-H", "--host", help="Listening address", type=str, default="127.0.0.1")
+    parser.add_argument("-P", "--port", help="Listening port", type=int, default=8000)
+    parser.add_argument("-p", "--pulls", help="Synthetic pull requests", type=int, default=1000)
+    parser.add_argument("-i", "--issues", help="Synthetic issues", type=int, default=1000)
+    parser.add_argument("-l", "--latency_ms", help="Latency added to every response in milliseconds", type=float, default=0)
+    parser.add_argument("-rl", "--rate_limit", help="Requests per token and window", type=int, default=5000)
+    parser.add_argument("-rw", "--rate_window", help="Rate-limit window in seconds", type=int, default=3600)
+    parser.add_argument("-r", "--replay", help="Recorded responses to serve, or the recording to write with --upstream", type=str, default=None)
+    parser.add_argument("-up", "--upstream", help="Record the responses of this API, e.g., https://api.github.com", type=str, default=None)
+    args = parser.parse_args()
+
+    stub = GithubStubServer(args.host, args.port, SyntheticRepository(pull_count=args.pulls, issue_count=args.issues), args.latency_ms / 1000,
+                            args.rate_limit, args.rate_window, args.replay, args.upstream)
+    print("GitHub stand-in listening on {}, Ctrl+C to stop".format(stub.base_url))
+    stub.start()
+    try:
+        stub.thread.join()
+    except KeyboardInterrupt:
+        stub.stop()
@@ -0,0 +1,110 @@
+import os
+import subprocess
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Iterator, List, Optional
+
+
+class FileChange:
+    def __init__(self, change_type: str, old_path: Optional[str], new_path: Optional[str], old_blob: Optional[str], new_blob: Optional[str]):
+        self.change_type = change_type
+        self.old_path = old_path
+        self.new_path = new_path
+        self.old_blob = old_blob
+        self.new_blob = new_blob
+
+    @property
+    def path(self) -> str:
+        # As utils.get_file_path, the new path unless the file has been deleted
+        return self.new_path if self.new_path else self.old_path
+
+    @property
+    def filename(self) -> str:
+        return os.path.basename(self.path)
+
+
+class CommitRecord:
+    def __init__(self, commit_hash: str, parents: List[str], author_email: str, blame_email: str, committer_email: str, committer_date: datetime):
+        self.hash = commit_hash
+        self.parents = parents
+        self.author_email = author_email
+        # Author email after .mailmap, as git blame reports it
+        self.blame_email = blame_email
+        self.committer_email = committer_email
+        self.committer_date = committer_date
+        self.lines = 0
+        self.changes: list[FileChange] = []
+
+    @property
+    def files(self) -> List[str]:
+        # Paths as pydriller reports them, i.e., the new path of renamed files and the old path of deleted ones
+        return [change.path for change in self.changes]
+
+
+class GitLogScanner:
+    # Record separator, it cannot appear in the hash and email fields
+    COMMIT_MARKER = "\x1e"
+    NULL_SHA = "0" * 40
+
+    def __init__(self, local_path: str):
+        self.local_path = local_path
+
+    @staticmethod
+    def _git_date(date: datetime) -> str:
+        # Naive dates are UTC, as pydriller does for since/to
+        if date.tzinfo is None or date.tzinfo.utcoffset(date) is None:
+            date = date.replace(tzinfo=timezone.utc)
+        return str(date)
+
+    @classmethod
+    def _parse_raw(cls, line: str) -> FileChange:
+        # ":100644 100644 <old blob> <new blob> M\tpath" or, for renames and copies, ":... R100\told path\tnew path"
+        meta, *paths = line.split("\t")
+        _, _, old_blob, new_blob, status = meta.split(" ")
+        change_type = status[0]
+        old_blob = None if old_blob == cls.NULL_SHA else old_blob
+        new_blob = None if new_blob == cls.NULL_SHA else new_blob
+        if change_type in ("R", "C"):
+            return FileChange(change_type, paths[0], paths[1], old_blob, new_blob)
+        if change_type == "A":
+            return FileChange(change_type, None, paths[0], old_blob, new_blob)
+        if change_type == "D":
+            return FileChange(change_type, paths[0], None, old_blob, new_blob)
+        return FileChange(change_type, paths[0], paths[0], old_blob, new_blob)
+
+    def scan(self, since: datetime, to: datetime, file_types: Optional[List[str]] = None) -> Iterator[CommitRecord]:
+        # Same selection of Repository(since, to, only_no_merge=True, only_modifications_with_file_types), oldest commit first
+        command = ['git', '-C', self.local_path, '-c', 'core.quotepath=off', 'log', '--reverse', '--no-merges', '--raw', '--no-abbrev', '--numstat',
+                   '--format=' + self.COMMIT_MARKER + '%H%x1f%P%x1f%ae%x1f%aE%x1f%ce%x1f%cI',
+                   '--since=' + self._git_date(since), '--until=' + self._git_date(to)]
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+
+        record = None
+        for raw_line in process.stdout:
+            line = raw_line.decode('utf-8', 'ignore').rstrip("\n")
+            if line.startswith(self.COMMIT_MARKER):
+                if record is not None and self._accept(record, file_types):
+                    yield record
+                commit_hash, parents, author_email, blame_email, committer_email, committer_date = line[len(self.COMMIT_MARKER):].split("\x1f", 5)
+                record = CommitRecord(commit_hash, parents.split(), author_email, blame_email, committer_email, datetime.fromisoformat(committer_date))
+            elif line.startswith(":") and record is not None:
+                record.changes.append(self._parse_raw(line))
+            elif line and record is not None:
+                insertions, deletions, _ = line.split("\t", 2)
+                # Binary files report "-", counted as zero lines as GitPython does
+                record.lines += (int(insertions) if insertions != "-" else 0) + (int(deletions) if deletions != "-" else 0)
+        if record is not None and self._accept(record, file_types):
+            yield record
+
+        process.stdout.close()
+        process.wait()
+
+    @staticmethod
+    def _accept(record: CommitRecord, file_types: Optional[List[str]]) -> bool:
+        return file_types is None or any(path.endswith(tuple(file_types)) for path in record.files)
+
+    @staticmethod
+    def count_lines_per_author(records: Iterable[CommitRecord]) -> Dict[str, int]:
+        lines_per_author: dict[str, int] = {}
+        for record in records:
+            lines_per_author[record.author_email] = lines_per_author.get(record.author_email, 0) + record.lines
+        return lines_per_author
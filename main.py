@@ -2,29 +2,34 @@ import argparse
 import os
 import pytz
 import utils
+import writers
+import numpy as np
 import pandas as pd
 from datetime import datetime
-from typing import Dict
+from typing import Dict, Iterator, List, Tuple
 from git import NoSuchPathError
-from pydriller import Repository
 from utils import GitHubBean, MyProgressBar
 from githubAPI import GithubParallelTraversing
-from readability import Readability
+from githubCache import GithubResponseCache
+from githubGraphQL import GithubGraphQLTraversing
+from gitlog import GitLogScanner
+from blobs import BlobReader
+from cache import SqliteLruCache
+from readability import Readability, ReadabilityExecutor, ReadabilityQuarantine
+from sonar import SonarIndex, SonarPartitions, load_sonar_frame
+from oexp import OexpTracker
+from process import ProcessMetrics
+from scheduler import ProjectScheduler
 
 
 def main(flags: Dict[str, str]) -> None:
     # Column names: organization, project, analysis_key, date, project_version ,revision, processed, ingested_at
-    dfa = pd.read_csv(flags["sonar_analyses_path"], sep=',')
-    orig_len = len(dfa.index)
-    dfa = dfa.drop_duplicates()
-    print("Removed {} duplicated lines of {} from {}".format(orig_len - len(dfa.index), orig_len, flags["sonar_analyses_path"]))
+    # Typed frames without duplicated lines and empty columns, a binary snapshot of each one spares the CSV parsing to the next runs
+    dfa = load_sonar_frame(flags["sonar_analyses_path"], "analyses", snapshot=flags["sonar_snapshot"])
 
     # Column names: organization, project, current_analysis_key, creation_analysis_key, issue_key, type, rule, severity, status, resolution, effort, debt,
     # tags, creation_date, update_date, close_date, processed, ingested_at
-    dfi = pd.read_csv(flags["sonar_issues_path"], sep=',')
-    orig_len = len(dfi.index)
-    dfi = dfi.drop_duplicates()
-    print("Removed {} duplicated lines of {} from {}".format(orig_len - len(dfi.index), orig_len, flags["sonar_issues_path"]))
+    dfi = load_sonar_frame(flags["sonar_issues_path"], "issues", snapshot=flags["sonar_snapshot"])
 
     # Column names: organization, project, analysis_key, complexity, class_complexity, function_complexity, file_complexity, function_complexity_distribution,
     # file_complexity_distribution, complexity_in_classes, complexity_in_functions, cognitive_complexity, test_errors, skipped_tests, test_failures, tests,
@@ -42,36 +47,31 @@ def main(flags: Dict[str, str]) -> None:
     # security_hotspots, new_security_hotspots, security_review_rating, classes, ncloc, functions, comment_lines, comment_lines_density, files, directories,
     # lines, statements, generated_lines, generated_ncloc, ncloc_data, comment_lines_data, projects, ncloc_language_distribution, new_lines, processed,
     # ingested_at
-    dfm = pd.read_csv(flags["sonar_measures_path"], sep=',', low_memory=False)
-    orig_len = len(dfm.index)
-    dfm = dfm.drop_duplicates()
-    print("Removed {} duplicated lines of {} from {}".format(orig_len - len(dfm.index), orig_len, flags["sonar_measures_path"]))
+    dfm = load_sonar_frame(flags["sonar_measures_path"], "measures", flags["sonar_measure_columns"], flags["sonar_snapshot"])
 
     # Build a dictionary of dataframes for fast iteration
     df = {"analyses": dfa, "issues": dfi, "measures": dfm}
 
     # Get basic stats
-    print("Projects in analyses {} in issues {} in measures {}".format(dfa.groupby(["organization", 'project']).ngroups,
-                                                                       dfi.groupby(["organization", 'project']).ngroups,
-                                                                       dfm.groupby(["organization", 'project']).ngroups))
+    print("Projects in analyses {} in issues {} in measures {}".format(dfa.groupby(["organization", 'project'], observed=True).ngroups,
+                                                                       dfi.groupby(["organization", 'project'], observed=True).ngroups,
+                                                                       dfm.groupby(["organization", 'project'], observed=True).ngroups))
 
-    # Remove empy and NaN columns
     for k, v in df.items():
-        v.replace("", float("NaN"), inplace=True)
-        v.dropna(how='all', axis=1, inplace=True)
         # Txt(os.path.join(abs_data_path, "header_{}.txt".format(k))).write_and_close(", ".join(v.columns.values))
         print("Header {}: {}".format(k, ", ".join(v.columns.values)))
 
     # Build GitHub links from the SonarQube list of projects
     github_beans: set[GitHubBean] = set()
     for k, v in df.items():
-        for (organization, project), group_df in v.groupby(["organization", 'project']):
+        for (organization, project), group_df in v.groupby(["organization", 'project'], observed=True):
             name = project[project.index("_") + 1:] if '_' in project else project
             github_beans.add(GitHubBean(flags["clone_path"], organization, name, project))
     github_beans: list[GitHubBean] = sorted(github_beans, key=lambda x: x.local_path)
 
     # Remove projects not actually analyzed by SonarQube
-    github_beans: list[GitHubBean] = list(filter(lambda x: (x.sonar_name in dfa["project"].values), github_beans))
+    analyzed_projects = set(dfa["project"].unique())
+    github_beans: list[GitHubBean] = list(filter(lambda x: (x.sonar_name in analyzed_projects), github_beans))
 
     # Clone repositories locally
     if flags["always_clone_first"]:
@@ -85,228 +85,342 @@ def main(flags: Dict[str, str]) -> None:
         file_cloned.close()
         bar.close()
 
-    # Instantiate Readability
-    readability = Readability(flags["readability_tool"], flags["temp_filename"], int(flags['readability_timeout']))
-
-    # GitHub API parser
-    ght = GithubParallelTraversing(flags["tokens"].split(','))
-
     # Get a list of analyzed projects in form of URLs to skip them
     analyzed_urls: list[str] = []
     if os.path.exists(flags["analyzed_urls"]):
         dfu = pd.read_csv(flags["analyzed_urls"], sep=',')
         analyzed_urls = dfu['url'].tolist()
 
-    # Get Sonar metrics per project
-    project_index = 0
-    for gh_bean in github_beans:
+    # Get Sonar metrics per project, several projects run at once when --parallel_projects > 1
+    sonar_columns = dfm.columns.to_list() + dfi.columns.to_list()
+    # Split the frames per project once, the whole frames are no longer needed (v still refers to the last of them)
+    partitions = SonarPartitions(dfa, dfm, dfi)
+    del df, dfa, dfm, dfi, v
+    scheduler = ProjectScheduler(int(flags["parallel_projects"]), int(flags["io_budget"]))
+    statuses = scheduler.run(ProjectWorkers, (flags,), analyze_project, project_tasks(github_beans, analyzed_urls, partitions, sonar_columns, flags))
+    scheduler.print_summary(statuses)
+
+
+def project_tasks(github_beans: List[GitHubBean], analyzed_urls: List[str], partitions: SonarPartitions, sonar_columns: List[str],
+                  flags: Dict[str, str]) -> Iterator[Tuple[str, tuple]]:
+    for project_index, gh_bean in enumerate(github_beans):
+        # Each project only carries its own analyses and the measures and issues of those analyses
+        dfa_project, dfm_project, dfi_project = partitions.pop(gh_bean.owner, gh_bean.sonar_name)
         if gh_bean.url not in analyzed_urls:
-            try:
-                # Get datatime interval in accord to SonarQube analyses
-                df_sel = dfa[(dfa["organization"] == "apache") & (dfa["project"] == gh_bean.sonar_name)]
-                start_date = datetime.strptime(min(df_sel["date"]), "%Y-%m-%d %H:%M:%S")
-                stop_date = datetime.strptime(max(df_sel["date"]), "%Y-%m-%d %H:%M:%S")
-
-                # Force cloning and checkout if not already done
-                utils.clone_project(gh_bean)
-                # Traverse commits from the oldest to the latest in the selected interval time
-                repo = Repository(gh_bean.local_path, since=start_date, to=stop_date, only_no_merge=True, only_modifications_with_file_types=[".java"])
-                project_status = "{}/{})".format(project_index, len(github_beans))
-                print("{} Analyzing {} from {} to {}".format(project_status, gh_bean.url, start_date, stop_date))
-                line_count = 0
-                discarded_commit_count = commit_count = 0
-
-                # Count OEXP metric
-                lines_per_author: dict[str, int] = {}
-                for commit in repo.traverse_commits():
-                    commit_count += 1
-                    if commit.author.email not in lines_per_author:
-                        lines_per_author["OEXP_" + commit.author.email] = 0
-                    lines_per_author["OEXP_" + commit.author.email] += commit.lines
-
-                sonar_commits = len(df_sel.groupby(["analysis_key"])["analysis_key"])
-                gh_bean.print_report("In {}, from {} to {}, pydriller found {} commits, SonarQube has {} commits analyzed. Missing {} commits"
-                                     .format(gh_bean.url, start_date, stop_date, commit_count, sonar_commits, commit_count - sonar_commits))
-
-                # Prepare the CSV for the final analysis
-                fieldnames = (["github", "commit_hash", "committer_date", "modified_file_count", "file_path", "LMOD"]
-                              + readability.measure_list() + dfm.columns.to_list() + dfi.columns.to_list() + sorted(lines_per_author, reverse=True))
-                gh_bean.create_csvs(fieldnames)
-
-                # Reset OEXP
-                lines_per_author = lines_per_author.fromkeys(lines_per_author, 0)
-
-                # Get all pull requests and issues
-                repo_details = ght.get_repo_details(gh_bean.owner + "/" + gh_bean.name)
-
-                # Transform naive to aware datetime
-                start_date_tz = start_date.replace(tzinfo=pytz.UTC)
-                stop_date_tz = stop_date.replace(tzinfo=pytz.UTC)
-                # Traverse Pull Requests
-                pull_list = ght.get_pull_list(start_date_tz, stop_date_tz)
-                gh_bean.create_progress_bar(len(pull_list))
-                for pl_number in pull_list:
-                    gh_bean.update_bar("{} Getting pull {}".format(project_status, pl_number))
-                    pull_details = ght.get_pull_details(pl_number)
-
-                    # Get all commit hashes of this pull requests
-                    commit_list = ght.get_pull_commit_list(pl_number)
-                    # Get all discussions of this pull requests
-                    discussion_list = ght.get_pull_issue_list(pl_number, start_date_tz, stop_date_tz)
-
-                    discussions_login: list[str] = []
-                    discussions_name: list[str] = []
-                    discussions_email: list[str] = []
-                    for discussion_id in discussion_list:
-                        discussion = ght.get_pull_issue_details(pl_number, discussion_id)
-                        discussions_login.append(discussion["user_login"])
-                        discussions_name.append(discussion["user_name"])
-                        discussions_email.append(discussion["user_email"])
-
-                    gh_bean.append_pull({"commit_list": commit_list,
-                                         "comment_list_login": discussions_login,
-                                         "comment_list_name": discussions_name,
-                                         "comment_list_email": discussions_email,
-                                         } | repo_details | pull_details)
-
-                # Traverse Issues
-                issue_list = ght.get_issue_list(start_date_tz, stop_date_tz)
-                gh_bean.create_progress_bar(len(issue_list))
-                for issue_number in issue_list:
-                    gh_bean.update_bar("{} Getting issue {}".format(project_status, issue_number))
-                    issue_details = ght.get_issue_details(issue_number)
-                    gh_bean.append_issue(repo_details | issue_details)
-
-                # We already know the number of commits to traverse, so we can create the progress bar
-                gh_bean.create_progress_bar(commit_count)
-                for commit in repo.traverse_commits():
-                    gh_bean.update_bar("{} Analyzing {}".format(project_status, gh_bean.url))
-
-                    # Count number of globally authored lines
-                    line_count += commit.lines
-                    # Count number of authored lines per author
-                    lines_per_author["OEXP_" + commit.author.email] += commit.lines
-
-                    # Search for SonarQube (analyses) metrics, if any
-                    sonar_analyses = dfa[(dfa["project"] == gh_bean.sonar_name) & (dfa["revision"] == commit.hash)]
-                    gh_bean.print_report("Found {} sonar analyses for {} {}".format(len(sonar_analyses["analysis_key"]), commit.hash, commit.committer_date))
-                    sonar_analysis_key = None if sonar_analyses.empty else sonar_analyses["analysis_key"].iloc[0]
-
-                    modified_files = []
-                    for mod_file in commit.modified_files:
-                        file_path = mod_file.new_path if mod_file.new_path else mod_file.old_path
-                        modified_files.append(file_path)
-
-                    # Generate statistics
-                    file_count = len(modified_files)
-                    stat_dict: dict[str, str] = {
-                        "project": gh_bean.url,
-                        "commit_hash": commit.hash,
-                        "committer_date": commit.committer_date,
-                        "modified_files": modified_files,
+            project_status = "{}/{})".format(project_index, len(github_beans))
+            yield gh_bean.url, (gh_bean, project_status, flags, dfa_project, dfm_project, dfi_project, sonar_columns)
+        else:
+            print("{} already analyzed, skip it".format(gh_bean.url))
+
+
+class ProjectWorkers:
+    def __init__(self, slot: int, slot_count: int, flags: Dict[str, str]):
+        # Every project running at once gets its share of the global JVM, thread, and GitHub token budgets
+        readability_cache = None
+        if flags["readability_cache"]:
+            readability_cache = SqliteLruCache(flags["readability_cache"], int(flags["readability_cache_mb"]) * 1024 * 1024)
+        # Projects running at once never write to the same temp files
+        temp_filename = flags["temp_filename"]
+        if slot_count > 1:
+            root, extension = os.path.splitext(temp_filename)
+            temp_filename = "{}_p{}{}".format(root, slot, extension)
+        self.readability = Readability(flags["readability_tool"], temp_filename, int(flags['readability_timeout']),
+                                       ProjectScheduler.share(int(flags['readability_workers']), slot_count, slot), readability_cache,
+                                       flags["readability_scope"], int(flags["readability_max_kb"]) * 1024, int(flags["readability_max_lines"]),
+                                       ReadabilityQuarantine(flags["readability_quarantine"]))
+        self.readability_executor = ReadabilityExecutor(self.readability, ProjectScheduler.share(int(flags["readability_threads"]), slot_count, slot))
+        self.blame_threads = ProjectScheduler.share(int(flags["blame_threads"]), slot_count, slot)
+
+        # Conditional-request cache of the GitHub responses, shared by the processes through the same file
+        self.http_cache = None
+        if flags["http_cache"]:
+            self.http_cache = GithubResponseCache(flags["http_cache"], int(flags["http_cache_mb"]) * 1024 * 1024, bool(flags["http_cache_offline"]))
+            self.http_cache.install()
+
+        # GitHub API parser
+        tokens = ProjectScheduler.share_list(flags["tokens"].split(','), slot_count, slot)
+        if flags["github_backend"] == "graphql":
+            self.ght = GithubGraphQLTraversing(tokens, max_workers=int(flags["github_threads"]))
+        else:
+            self.ght = GithubParallelTraversing(tokens, max_workers=int(flags["github_threads"]))
+
+    def close(self) -> None:
+        self.readability_executor.close()
+        self.readability.close()
+        self.ght.close()
+        if self.http_cache is not None:
+            print("GitHub response cache: {}".format(self.http_cache.stats()))
+            self.http_cache.close()
+
+
+def analyze_project(workers: ProjectWorkers, io_semaphore, gh_bean: GitHubBean, project_status: str, flags: Dict[str, str], dfa_project: pd.DataFrame,
+                    dfm_project: pd.DataFrame, dfi_project: pd.DataFrame, sonar_columns: List[str]) -> str:
+    readability = workers.readability
+    readability_executor = workers.readability_executor
+    ght = workers.ght
+
+    # Index analyses, measures, and issues once, per-commit lookups must not scan the whole dataframes
+    sonar_index = SonarIndex(dfa_project, dfm_project, dfi_project)
+
+    # Resume from the progress journal of a previous run, if any
+    journal = gh_bean.load_journal()
+    if journal is not None and journal["done"]:
+        print("{} already analyzed, skip it".format(gh_bean.url))
+        return "already analyzed"
+
+    # Closed whatever happens, a failed project must not leave its git processes, blame threads, and writers behind
+    blob_reader = None
+    process = None
+    try:
+        # Get datatime interval in accord to SonarQube analyses, the analyses of the project are already those of its organization
+        start_date = datetime.strptime(min(dfa_project["date"]), "%Y-%m-%d %H:%M:%S")
+        stop_date = datetime.strptime(max(dfa_project["date"]), "%Y-%m-%d %H:%M:%S")
+
+        # Force cloning and checkout if not already done, clones and full history scans share the global disk I/O budget
+        with io_semaphore:
+            utils.clone_project(gh_bean)
+            # Traverse commits from the oldest to the latest in the selected interval time. The metadata of all commits is streamed once,
+            # blobs are read only for commits analyzed by SonarQube
+            if not os.path.isdir(gh_bean.local_path):
+                raise NoSuchPathError(gh_bean.local_path)
+            commit_records = list(GitLogScanner(gh_bean.local_path).scan(start_date, stop_date, [".java"]))
+        blob_reader = BlobReader(gh_bean.local_path, int(flags["blob_cache_mb"]) * 1024 * 1024)
+        process = ProcessMetrics(gh_bean.local_path, blob_reader, workers.blame_threads) if flags["blame"] else None
+        print("{} Analyzing {} from {} to {}".format(project_status, gh_bean.url, start_date, stop_date))
+
+        # A journal only applies to the same history, otherwise start from scratch
+        if journal is not None and journal["commits_done"] > 0 and (journal["commits_done"] > len(commit_records)
+                                                                    or commit_records[journal["commits_done"] - 1].hash != journal["last_commit"]):
+            print("{} history changed since the last run, restart it".format(gh_bean.url))
+            journal = None
+            gh_bean.resuming = False
+        # Offsets of a journal point into the files of its compression and layout, journals older than the OEXP table had the wide layout
+        if journal is not None and (journal.get("csv_compression", "none") != flags["csv_compression"]
+                                    or journal.get("oexp_wide", True) != bool(flags["oexp_wide"])):
+            print("{} CSV compression or layout changed since the last run, restart it".format(gh_bean.url))
+            journal = None
+            gh_bean.resuming = False
+        gh_bean.csv_compression = flags["csv_compression"]
+        if journal is not None:
+            print("{} Resuming {} after {} pulls, {} issues, {} commits".format(project_status, gh_bean.url, journal["pulls_done"],
+                                                                             journal["issues_done"], journal["commits_done"]))
+
+        discarded_commit_count = journal["discarded_commit_count"] if journal is not None else 0
+
+        # Count OEXP metric, incrementally along the traversal. Its wide layout has one column per author of the interval
+        commit_count = len(commit_records)
+        oexp = OexpTracker(GitLogScanner.count_lines_per_author(commit_records))
+        oexp_wide = bool(flags["oexp_wide"])
+
+        sonar_commits = len(dfa_project.groupby(["analysis_key"], observed=True)["analysis_key"])
+        gh_bean.print_report("In {}, from {} to {}, pydriller found {} commits, SonarQube has {} commits analyzed. Missing {} commits"
+                             .format(gh_bean.url, start_date, stop_date, commit_count, sonar_commits, commit_count - sonar_commits))
+
+        # Prepare the CSV for the final analysis, commits aggregate the readability of their files
+        readability_aggregates = flags["readability_aggregates"]
+        readability_columns = readability.measure_list() if flags["analysis_per_file"] else readability.aggregate_list(readability_aggregates)
+        fieldnames = (["github", "commit_hash", "committer_date", "modified_file_count", "file_path", "LMOD"]
+                      + readability_columns + (ProcessMetrics.measure_list() if process is not None else []) + sonar_columns
+                      + (oexp.columns() if oexp_wide else []))
+        # Column types of the Parquet copy, Sonar columns keep the type pandas found in the source CSVs
+        result_types = {"committer_date": "timestamp", "modified_file_count": "int", "LMOD": "float"}
+        for sonar_frame in (dfm_project, dfi_project):
+            result_types.update({column: "float" for column in sonar_frame.columns if pd.api.types.is_numeric_dtype(sonar_frame[column])})
+        result_types.update({column: "float" for column in readability_columns + ProcessMetrics.measure_list() + oexp.columns()})
+        gh_bean.parquet = bool(flags["parquet"])
+        if journal is None:
+            journal = {"done": False, "fieldnames": fieldnames, "pull_list": None, "pulls_done": 0, "issue_list": None, "issues_done": 0,
+                       "commits_done": 0, "last_commit": None, "discarded_commit_count": 0, "csv_compression": flags["csv_compression"],
+                       "oexp_wide": oexp_wide}
+            gh_bean.create_csvs(fieldnames, result_types=result_types, oexp=not oexp_wide)
+        else:
+            # Truncate the CSVs at the last checkpoint, rows are appended exactly as an uninterrupted run would do
+            gh_bean.create_csvs(journal["fieldnames"], journal["offsets"], result_types, not oexp_wide)
+
+        # Get all pull requests and issues
+        repo_details = ght.get_repo_details(gh_bean.owner + "/" + gh_bean.name)
+
+        # Transform naive to aware datetime
+        start_date_tz = start_date.replace(tzinfo=pytz.UTC)
+        stop_date_tz = stop_date.replace(tzinfo=pytz.UTC)
+        # Traverse Pull Requests
+        if journal["pull_list"] is None:
+            journal["pull_list"] = ght.get_pull_list(start_date_tz, stop_date_tz)
+            gh_bean.checkpoint(journal, force=True)
+        pull_list = journal["pull_list"]
+        gh_bean.create_progress_bar(len(pull_list))
+        pending_pulls = pull_list[journal["pulls_done"]:]
+        for pl_number, pull_record in zip(pending_pulls, ght.get_pull_record_many(pending_pulls, start_date_tz, stop_date_tz)):
+            gh_bean.update_bar("{} Getting pull {}".format(project_status, pl_number))
+            gh_bean.append_pull(repo_details | pull_record)
+            journal["pulls_done"] += 1
+            gh_bean.checkpoint(journal)
+
+        # Traverse Issues
+        if journal["issue_list"] is None:
+            journal["issue_list"] = ght.get_issue_list(start_date_tz, stop_date_tz)
+            gh_bean.checkpoint(journal, force=True)
+        issue_list = journal["issue_list"]
+        gh_bean.create_progress_bar(len(issue_list))
+        pending_issues = issue_list[journal["issues_done"]:]
+        for issue_number, issue_details in zip(pending_issues, ght.get_issue_details_many(pending_issues)):
+            gh_bean.update_bar("{} Getting issue {}".format(project_status, issue_number))
+            gh_bean.append_issue(repo_details | issue_details)
+            journal["issues_done"] += 1
+            gh_bean.checkpoint(journal)
+
+        # We already know the number of commits to traverse, so we can create the progress bar
+        gh_bean.create_progress_bar(commit_count)
+        for record_index, record in enumerate(commit_records):
+            gh_bean.update_bar("{} Analyzing {}".format(project_status, gh_bean.url))
+
+            # Count number of globally authored lines and of the lines authored by the commit author
+            oexp.update(record.author_email, record.lines)
+
+            # Commits completed by a previous run only contribute to OEXP
+            if record_index < journal["commits_done"]:
+                continue
+
+            if not oexp_wide:
+                gh_bean.append_oexp(oexp.sparse(record_index, record.hash, record.author_email))
+
+            java_changes = [change for change in record.changes if change.filename.endswith(".java")]
+            blamed = False
+
+            # Search for SonarQube (analyses) metrics, if any
+            sonar_analysis_keys = sonar_index.get_analysis_keys(gh_bean.sonar_name, record.hash)
+            gh_bean.print_report("Found {} sonar analyses for {} {}".format(len(sonar_analysis_keys), record.hash, record.committer_date))
+            sonar_analysis_key = sonar_analysis_keys[0] if sonar_analysis_keys else None
+
+            # Generate statistics
+            modified_files = record.files
+            file_count = len(modified_files)
+            stat_dict: dict[str, str] = {
+                "project": gh_bean.url,
+                "commit_hash": record.hash,
+                "committer_date": record.committer_date,
+                "modified_files": modified_files,
+                "modified_file_count": file_count,
+                "author_email": record.author_email,
+                "committer_email": record.committer_email,
+                "sonar_analyses": len(sonar_analysis_keys),
+                "sonar_measures": 0,
+                "sonar_issues": 0,
+            }
+
+            if sonar_analysis_keys:
+                if file_count < 500:
+                    # Prepare results
+                    # msg = commit.msg.lower()
+                    result_dict: dict[str, str] = {
+                        "github": gh_bean.url,
+                        "commit_hash": record.hash,
+                        "committer_date": record.committer_date,
                         "modified_file_count": file_count,
-                        "author_email": commit.author.email,
-                        "committer_email": commit.committer.email,
-                        "sonar_analyses": len(sonar_analyses["analysis_key"]),
-                        "sonar_measures": 0,
-                        "sonar_issues": 0,
                     }
 
-                    if not sonar_analyses.empty:
-                        if file_count < 500:
-                            # Prepare results
-                            # msg = commit.msg.lower()
-                            result_dict: dict[str, str] = {
-                                "github": gh_bean.url,
-                                "commit_hash": commit.hash,
-                                "committer_date": commit.committer_date,
-                                "modified_file_count": file_count,
-                            }
-
-                            # Append sonar's measures.
-                            # sonar_measures.csv may have multiple measures corresponding to the same analysis_key or even zero
-                            sub_dfm = dfm[dfm["analysis_key"] == sonar_analysis_key]
-                            if not sub_dfm.empty:
-                                result_dict.update(sub_dfm.iloc[[0]].to_dict('records')[0])
-                                stat_dict["sonar_measures"] = str(len(sub_dfm["analysis_key"]))
-                            else:
-                                gh_bean.print_report("Found 0 measures for {}".format(sonar_analysis_key))
+                    # Append sonar's measures.
+                    # sonar_measures.csv may have multiple measures corresponding to the same analysis_key or even zero
+                    sonar_measure = sonar_index.get_measure(sonar_analysis_key)
+                    if sonar_measure is not None:
+                        result_dict.update(sonar_measure)
+                        stat_dict["sonar_measures"] = str(sonar_index.get_measure_count(sonar_analysis_key))
+                    else:
+                        gh_bean.print_report("Found 0 measures for {}".format(sonar_analysis_key))
 
-                            # Append sonar's issues
-                            sub_dfi = dfi[dfi["current_analysis_key"] == sonar_analysis_key]
-                            if not sub_dfi.empty:
-                                result_dict.update(sub_dfi.iloc[[0]].to_dict('records')[0])
-                                stat_dict["sonar_issues"] = str(len(sub_dfm["analysis_key"]))
-                            else:
-                                gh_bean.print_report("Found 0 issues for {}".format(sonar_analysis_key))
-
-                            # OEXP. % of lines authored in the project up to considered commit
-                            result_dict.update({k: v / line_count * 100 for k, v in lines_per_author.items()})
-
-                            # LMOD
-                            lines_in_commit = 0
-                            for mod in commit.modified_files:
-                                if mod.source_code is not None:
-                                    lines_in_commit += mod.source_code.count("\n")
-                            result_dict["LMOD"] = str(commit.lines / lines_in_commit * 100) if lines_in_commit != 0 else 0
-
-                            # Traverse repo's files
-                            readability_delta_list: list[dict[str, float]] = []
-                            for mod, file_index in zip(commit.modified_files, range(1, file_count + 1)):
-                                if mod.filename.endswith(".java"):
-                                    gh_bean.update_bar(
-                                        "{} Parsing {}/commit/{} file {}/{}".format(project_status, gh_bean.url, commit.hash, file_index, file_count))
-
-                                    # Get a list (per file) of the last modified lines by using git blame
-                                    # The following is a computational expensive operation!
-                                    # process_metrics = process.get_process_metrics(commit.hash, get_file_path(mod), commit.author)
-
-                                    # Calculate readability
-                                    readability_delta = readability.get_delta(mod.source_code_before, mod.source_code)
-
-                                    # Append readability delta
-                                    if readability_delta is not None:
-                                        if flags["analysis_per_file"]:
-                                            result_dict.update(readability.expand_dictionary(readability_delta))
-                                            result_dict["file_path"] = utils.get_file_path(mod)
-                                            gh_bean.append_result(result_dict)
-                                        else:
-                                            readability_delta_list.append(readability.expand_dictionary(readability_delta))
-                                    else:
-                                        gh_bean.print_report("Readability missing for {}/commit/{}".format(gh_bean.url, commit.hash))
-
-                            # Aggregate readability by commit
-                            if not flags["analysis_per_file"]:
-                                # Get average of delta measures
-                                delta_avg = {}
-                                for key in readability.measure_list():
-                                    delta_avg[key] = 0
-                                    for delta in readability_delta_list:
-                                        if delta[key] is not None:
-                                            delta_avg[key] += delta[key]
-                                    delta_avg[key] / len(readability.measure_list())
-
-                                result_dict.update(delta_avg)
+                    # Append sonar's issues
+                    sonar_issue = sonar_index.get_issue(sonar_analysis_key)
+                    if sonar_issue is not None:
+                        result_dict.update(sonar_issue)
+                        stat_dict["sonar_issues"] = str(sonar_index.get_issue_count(sonar_analysis_key))
+                    else:
+                        gh_bean.print_report("Found 0 issues for {}".format(sonar_analysis_key))
+
+                    # OEXP. % of lines authored in the project up to considered commit, in the sparse layout it is in the oexp table
+                    if oexp_wide:
+                        result_dict.update(oexp.wide())
+
+                    # LMOD
+                    lines_in_commit = 0
+                    for change in record.changes:
+                        line_count_in_file = blob_reader.line_count(change.new_blob)
+                        if line_count_in_file is not None:
+                            lines_in_commit += line_count_in_file
+                    result_dict["LMOD"] = str(record.lines / lines_in_commit * 100) if lines_in_commit != 0 else 0
+
+                    # Traverse repo's files
+                    gh_bean.update_bar("{} Parsing {}/commit/{} {} files".format(project_status, gh_bean.url, record.hash, len(java_changes)))
+
+                    # Blame the files while their readability is calculated, results are in the same order of java_changes
+                    process_futures = process.submit_process_metrics(record, java_changes) if process is not None else []
+                    blamed = process is not None
+
+                    # Calculate readability of all files concurrently, results are in the same order of java_changes
+                    readability_deltas = readability_executor.get_deltas([(blob_reader.text(change.old_blob), blob_reader.text(change.new_blob))
+                                                                          for change in java_changes])
+                    process_metrics_list = [future.result() for future in process_futures] if process is not None else [None] * len(java_changes)
+
+                    readability_delta_list: list[np.ndarray] = []
+                    for change, (readability_delta, skip_reason), process_metrics in zip(java_changes, readability_deltas, process_metrics_list):
+                        # Append ownership of the file lines, from git blame
+                        if process is not None and flags["analysis_per_file"]:
+                            result_dict.update(process_metrics if process_metrics is not None else dict.fromkeys(ProcessMetrics.measure_list()))
+
+                        # Append readability delta
+                        if readability_delta is not None:
+                            if flags["analysis_per_file"]:
+                                result_dict.update(readability.expand_dictionary(readability_delta))
+                                result_dict["file_path"] = change.path
                                 gh_bean.append_result(result_dict)
-
+                            else:
+                                readability_delta_list.append(readability_delta)
+                        elif skip_reason is not None:
+                            gh_bean.print_exception("Readability skipped for {}/commit/{} {}: {}".format(gh_bean.url, record.hash, change.path, skip_reason))
                         else:
-                            gh_bean.print_exception("{}/commit/{} has too many files to run readability tool".format(gh_bean.url, commit.hash))
-                    else:
-                        discarded_commit_count += 1
-                        gh_bean.print_exception(
-                            "{}. Cannot find {} {} in {}".format(discarded_commit_count, commit.hash, commit.committer_date, flags["sonar_analyses_path"]))
-
-                    # Append stat
-                    gh_bean.append_stat(stat_dict)
-
-                gh_bean.print_exception("{} {}/{} missing commit in SonarQube for {}".format(project_status, discarded_commit_count, commit_count, gh_bean.url))
-                gh_bean.close()
-            except NoSuchPathError as exception:
-                print("Skipping {} due to {}".format(gh_bean.url, exception))
-        else:
-            print("{} already analyzed, skip it".format(gh_bean.url))
-        # Increment project index, zip does not work in PyCharm with code assistant
-        project_index += 1
+                            gh_bean.print_report("Readability missing for {}/commit/{}".format(gh_bean.url, record.hash))
+
+                    # Aggregate readability by commit
+                    if not flags["analysis_per_file"]:
+                        # Get mean, and optionally min and max, of delta measures
+                        result_dict.update(readability.aggregate(readability_delta_list, readability_aggregates))
+                        # Get average of the blame metrics of the files
+                        if process is not None:
+                            for key in ProcessMetrics.measure_list():
+                                values = [metrics[key] for metrics in process_metrics_list if metrics is not None]
+                                result_dict[key] = sum(values) / len(values) if values else None
+                        gh_bean.append_result(result_dict)
+
+                else:
+                    gh_bean.print_exception("{}/commit/{} has too many files to run readability tool".format(gh_bean.url, record.hash))
+            else:
+                discarded_commit_count += 1
+                gh_bean.print_exception(
+                    "{}. Cannot find {} {} in {}".format(discarded_commit_count, record.hash, record.committer_date, flags["sonar_analyses_path"]))
+
+            # Commits without blame metrics still carry the known blames forward
+            if process is not None and not blamed:
+                process.track(record, java_changes)
+
+            # Append stat
+            gh_bean.append_stat(stat_dict)
+            journal.update({"commits_done": record_index + 1, "last_commit": record.hash, "discarded_commit_count": discarded_commit_count})
+            gh_bean.checkpoint(journal)
+
+        gh_bean.print_exception("{} {}/{} missing commit in SonarQube for {}".format(project_status, discarded_commit_count, commit_count, gh_bean.url))
+        if process is not None:
+            gh_bean.print_report("{} blame: {}".format(gh_bean.url, process.stats()))
+        journal["done"] = True
+        gh_bean.checkpoint(journal, force=True)
+    except NoSuchPathError as exception:
+        print("Skipping {} due to {}".format(gh_bean.url, exception))
+        return "skipped: {}".format(exception)
+    finally:
+        if process is not None:
+            process.close()
+        if blob_reader is not None:
+            blob_reader.close()
+        gh_bean.close()
+    return "analyzed"
 
 
 if __name__ == '__main__':
@@ -319,7 +433,39 @@ if __name__ == '__main__':
     parser.add_argument("-sa", "--sonar_analyses", help="SonarQube analyses file", type=str, default="sonar_analyses.csv")
     parser.add_argument("-si", "--sonar_issues", help="SonarQube issues file", type=str, default="sonar_issues.csv")
     parser.add_argument("-sm", "--sonar_measures", help="SonarQube measures file", type=str, default="sonar_measures.csv")
+    parser.add_argument("-smc", "--sonar_measure_columns", help="Comma separated measures to load, identifiers are always loaded. Default: all",
+                        type=str, default=None)
+    parser.add_argument("-ns", "--no_sonar_snapshot", help="Parse the SonarQube CSVs without reading or writing their binary snapshots",
+                        action="store_true")
     parser.add_argument("-o", "--readability_timeout", help="Readability timout in seconds", type=int, default=300)
+    parser.add_argument("-rt", "--readability_threads", help="Files evaluated concurrently", type=int, default=os.cpu_count())
+    parser.add_argument("-w", "--readability_workers", help="Resident readability JVMs, 0 starts one JVM per file. Default: one per thread", type=int,
+                        default=None)
+    parser.add_argument("-rsc", "--readability_scope", help="Evaluate whole files, or only the methods enclosing the changed lines", type=str,
+                        choices=["file", "method"], default="file")
+    parser.add_argument("-ra", "--readability_aggregates", nargs='+', help="Aggregates of the file readability deltas of a commit",
+                        choices=["mean", "min", "max"], default=["mean"])
+    parser.add_argument("-rmk", "--readability_max_kb", help="Files over this size in KB are not evaluated, 0 for no cap", type=int, default=1024)
+    parser.add_argument("-rml", "--readability_max_lines", help="Files over this number of lines are not evaluated, 0 for no cap", type=int,
+                        default=20000)
+    parser.add_argument("-rq", "--readability_quarantine", help="File in data path listing the files that timed out, empty to disable", type=str,
+                        default="readability_quarantine.txt")
+    parser.add_argument("-rc", "--readability_cache", help="Readability cache file in data path, empty to disable", type=str,
+                        default="readability_cache.sqlite")
+    parser.add_argument("-rs", "--readability_cache_mb", help="Readability cache size bound in MB", type=int, default=1024)
+    parser.add_argument("-bc", "--blob_cache_mb", help="In-memory blob cache size bound in MB", type=int, default=256)
+    parser.add_argument("-nb", "--no_blame", help="Skip the git blame ownership metrics of the modified files", action="store_true")
+    parser.add_argument("-bt", "--blame_threads", help="Files blamed concurrently", type=int, default=os.cpu_count())
+    parser.add_argument("-pp", "--parallel_projects", help="Projects analyzed at once, each one in its own process", type=int, default=1)
+    parser.add_argument("-io", "--io_budget", help="Projects cloning or scanning their history at once", type=int, default=2)
+    parser.add_argument("-gth", "--github_threads", help="Concurrent GitHub requests, 0 runs four per token", type=int, default=0)
+    parser.add_argument("-gb", "--github_backend", help="GitHub API used to crawl pulls and issues", type=str, choices=["rest", "graphql"], default="rest")
+    parser.add_argument("-hc", "--http_cache", help="GitHub response cache file in data path, empty to disable", type=str, default="github_cache.sqlite")
+    parser.add_argument("-hs", "--http_cache_mb", help="GitHub response cache size bound in MB", type=int, default=2048)
+    parser.add_argument("-ho", "--http_cache_offline", help="Serve GitHub requests from the response cache only", action="store_true")
+    parser.add_argument("-cc", "--csv_compression", help="Compression of the output CSVs", type=str, choices=["none", "gzip", "zstd"], default="none")
+    parser.add_argument("-ow", "--oexp_wide", help="Write OEXP as one result column per author instead of the oexp table", action="store_true")
+    parser.add_argument("-pq", "--parquet", help="Also write typed Parquet copies of the output CSVs", action="store_true")
     parser.add_argument("-t", "--temp", help="Absolute temporary path. E.g., RAMDisk mount -t tmpfs -o size=500m tmpfs /mount", type=str, default="temp.java")
     parser.add_argument("-f", "--file_level", help="Save results at file level granularity", type=bool, default=False)
     parser.add_argument('-gt', '--tokens', nargs='*', help='GitHub tokens', required=True)
@@ -368,8 +514,27 @@ if __name__ == '__main__':
     temp_filename = args.temp
     file_level = args.file_level
     readability_timeout = args.readability_timeout
+    readability_threads = args.readability_threads
+    readability_workers = args.readability_workers if args.readability_workers is not None else readability_threads
+    readability_cache = os.path.join(abs_data_path, args.readability_cache) if args.readability_cache else None
+    readability_quarantine = os.path.join(abs_data_path, args.readability_quarantine) if args.readability_quarantine else None
+    http_cache = os.path.join(abs_data_path, args.http_cache) if args.http_cache else None
+    if args.http_cache_offline and http_cache is None:
+        print("Invalid --http_cache_offline argument: it requires --http_cache")
+        exit(-1)
+    if args.csv_compression == "zstd" and writers.zstandard is None:
+        print("Invalid --csv_compression argument: zstd requires the zstandard package")
+        exit(-1)
+    if args.parquet and writers.pyarrow is None:
+        print("Invalid --parquet argument: it requires the pyarrow package")
+        exit(-1)
     # Clean up token list
     tokens = ",".join(args.tokens)
+    if args.parallel_projects > len(tokens.split(',')):
+        # Every project running at once needs its own tokens, the local rate-limit tracking of a shared token would be wrong
+        print("Invalid --parallel_projects argument: {} projects at once need at least as many tokens, {} given".format(args.parallel_projects,
+                                                                                                                len(tokens.split(','))))
+        exit(-1)
 
     option_flags = {
         'readability_tool': abs_readability,
@@ -378,9 +543,33 @@ if __name__ == '__main__':
         'sonar_analyses_path': abs_sonar_analyses,
         'sonar_issues_path': abs_sonar_issues,
         'sonar_measures_path': abs_sonar_measures,
+        'sonar_measure_columns': args.sonar_measure_columns.split(',') if args.sonar_measure_columns else None,
+        'sonar_snapshot': not args.no_sonar_snapshot,
         'temp_filename': temp_filename,
         'analysis_per_file': file_level,
         'readability_timeout': readability_timeout,
+        'readability_threads': readability_threads,
+        'readability_workers': readability_workers,
+        'readability_scope': args.readability_scope,
+        'readability_aggregates': list(dict.fromkeys(args.readability_aggregates)),
+        'readability_cache': readability_cache,
+        'readability_max_kb': args.readability_max_kb,
+        'readability_max_lines': args.readability_max_lines,
+        'readability_quarantine': readability_quarantine,
+        'readability_cache_mb': args.readability_cache_mb,
+        'blob_cache_mb': args.blob_cache_mb,
+        'blame': not args.no_blame,
+        'blame_threads': args.blame_threads,
+        'parallel_projects': args.parallel_projects,
+        'io_budget': args.io_budget,
+        'github_threads': args.github_threads,
+        'csv_compression': args.csv_compression,
+        'parquet': args.parquet,
+        'oexp_wide': args.oexp_wide,
+        'github_backend': args.github_backend,
+        'http_cache': http_cache,
+        'http_cache_mb': args.http_cache_mb,
+        'http_cache_offline': args.http_cache_offline,
         'tokens': tokens,
         'always_clone_first': False,
         'projects_cloned': os.path.join(abs_data_path, "projects_cloned.csv"),
@@ -0,0 +1,30 @@
+from typing import Dict, Iterable, List
+
+
+class OexpTracker:
+    # OEXP: % of the lines authored in the project up to a commit, by each author
+    PREFIX = "OEXP_"
+
+    def __init__(self, authors: Iterable[str]):
+        self.authored_lines: dict[str, int] = dict.fromkeys(authors, 0)
+        self.total_lines = 0
+
+    def update(self, author: str, lines: int) -> None:
+        # A commit only changes its own author and the total
+        self.authored_lines[author] = self.authored_lines.get(author, 0) + lines
+        self.total_lines += lines
+
+    def share(self, author: str) -> float:
+        return self.authored_lines.get(author, 0) / self.total_lines * 100 if self.total_lines != 0 else 0
+
+    def columns(self) -> List[str]:
+        # Wide layout, one column per author
+        return sorted((self.PREFIX + author for author in self.authored_lines), reverse=True)
+
+    def wide(self) -> Dict[str, float]:
+        return {self.PREFIX + author: self.share(author) for author in self.authored_lines}
+
+    def sparse(self, commit_index: int, commit_hash: str, author: str) -> Dict[str, str]:
+        # Long layout, the row of the author of the commit. The ownership of any author at a commit is the one of their last row up to it
+        return {"commit_index": commit_index, "commit_hash": commit_hash, "author_email": author, "authored_lines": self.authored_lines.get(author, 0),
+                "total_lines": self.total_lines, "share": self.share(author)}
@@ -1,51 +1,189 @@
 import re
-from typing import List, Tuple, Optional, Dict
+import subprocess
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
 
-from git import GitCommandError
-from pydriller import Git
-from pydriller.domain.developer import Developer
+from blobs import BlobReader
+from gitlog import CommitRecord, FileChange
 
 
 class ProcessMetrics:
-    def __init__(self, local_repo_path: str):
-        self.py_git = Git(local_repo_path)
-        self.authored_lines = {}
-
-    def get_process_metrics(self, commit_hash: str, file_path: str, author: Developer) -> Tuple[Optional[float], Optional[float]]:
-        try:
-            py_blame = self.py_git._get_blame(commit_hash, file_path)
-
-            if py_blame is not None:
-                distinct_authors: Dict[str, int] = {}
-                # blamed_lines = []
-                for line in py_blame:
-                    reg_res = re.search(r"^([1-9a-fA-F]{8})(\s.*)\((.*)\s(\d\d\d\d-\d\d-\d\d)\s(\d\d:\d\d:\d\d)\s([-+]\d\d\d\d)\s+(\d+)\)\s(.*)$", line.strip())
-                    if reg_res and len(reg_res.groups()) == 8:
-                        # blamed_hash = reg_res.group(1).replace('^', '').strip()
-                        # blamed_file = reg_res.group(2).strip()
-                        blamed_author = reg_res.group(3).strip()
-                        # blamed_date = reg_res.group(4).strip()
-                        # blamed_time = reg_res.group(5).strip()
-                        # blamed_zone = reg_res.group(6).strip()
-                        # blamed_line = reg_res.group(7).strip()
-                        # blamed_src = reg_res.group(8).strip()
-                        # blamed_lines.append((blamed_hash, blamed_file, blamed_author, blamed_date, blamed_time, blamed_zone, blamed_line, blamed_src))
-
-                        # OEXP Measure
-                        if blamed_author not in distinct_authors:
-                            distinct_authors[blamed_author] = 0
-                        distinct_authors[blamed_author] += 1
-
-                    distinct_author_count = len(distinct_authors)
-                    authored_line_count = distinct_authors.get(author.name, 0)
-                    src_lines = len(py_blame)
-
-                    # blamed_lines.append((None, None, None, None, None, None, None, None))
-
-                # self.calculate_lmod(blamed_lines, author.name)
-        except GitCommandError as exception:
-            print(exception)
-        return None, None
-
-    # def calculate_lmod(self, blamed_lines: List[Tuple[str, str, str, str, str, str, str, str]], author: str) -> float:
-    #     return 0
+    # Hunk header of git diff -U0, i.e., "@@ -start[,count] +start[,count] @@"
+    HUNK = re.compile(rb"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+    def __init__(self, local_repo_path: str, blob_reader: BlobReader, max_workers: int, cache_lines: int = 4 * 1024 * 1024):
+        self.local_repo_path = local_repo_path
+        self.blob_reader = blob_reader
+        self.cache_lines = cache_lines
+        self.cached_lines = 0
+        # Blame of a file at a commit, i.e., the author email of each of its lines, keyed by (path, commit hash)
+        self.cache: OrderedDict[Tuple[str, str], List[str]] = OrderedDict()
+        # Last known blame of every path along the traversal, with the commit and the blob it describes
+        self.latest: dict[str, Tuple[str, str, List[str]]] = {}
+        self.lock = Lock()
+        self.full_blames = 0
+        self.incremental_blames = 0
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="blame")
+
+    @staticmethod
+    def measure_list() -> List[str]:
+        return ["blame_authors", "blame_ownership"]
+
+    def _cached(self, key: Tuple[str, str]) -> Optional[List[str]]:
+        with self.lock:
+            authors = self.cache.get(key)
+            if authors is not None:
+                self.cache.move_to_end(key)
+            return authors
+
+    def _linear(self, ancestor: str, commit: str) -> bool:
+        # No merge between the two commits could have brought the file from another line of history
+        result = subprocess.run(['git', '-C', self.local_repo_path, 'merge-base', '--is-ancestor', ancestor, commit],
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        return result.returncode == 0 and self._git(['rev-list', '--count', '--min-parents=2', ancestor + '..' + commit]) == b"0\n"
+
+    def _base(self, record: CommitRecord, change: FileChange) -> Optional[List[str]]:
+        # Blame of the file at the parent commit. Otherwise, the last known blame of the path if no commit changed the file since then
+        parent = record.parents[0]
+        with self.lock:
+            authors = self.cache.get((change.old_path, parent))
+            if authors is not None:
+                self.cache.move_to_end((change.old_path, parent))
+                return authors
+            latest = self.latest.get(change.old_path)
+        if latest is None or latest[1] != change.old_blob:
+            return None
+        return latest[2] if latest[0] == parent or self._linear(latest[0], parent) else None
+
+    def _store(self, record: CommitRecord, change: FileChange, authors: List[str]) -> None:
+        key = (change.new_path, record.hash)
+        with self.lock:
+            if change.old_path is not None and change.old_path != change.new_path:
+                self.latest.pop(change.old_path, None)
+            self.latest[change.new_path] = (record.hash, change.new_blob, authors)
+            if key in self.cache:
+                return
+            self.cache[key] = authors
+            self.cached_lines += len(authors)
+            while self.cached_lines > self.cache_lines and len(self.cache) > 1:
+                _, evicted = self.cache.popitem(last=False)
+                self.cached_lines -= len(evicted)
+
+    def _git(self, args: List[str]) -> Optional[bytes]:
+        result = subprocess.run(['git', '-C', self.local_repo_path] + args, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        if result.returncode != 0:
+            print("git {} failed: {}".format(" ".join(args), result.stderr.decode('utf-8', 'ignore').strip()))
+            return None
+        return result.stdout
+
+    def _full_blame(self, commit_hash: str, path: str) -> Optional[List[str]]:
+        output = self._git(['blame', '--porcelain', commit_hash, '--', path])
+        if output is None:
+            return None
+        with self.lock:
+            self.full_blames += 1
+
+        # Every line is "<commit> <original line> <final line> [<group size>]", the details of a commit at its first line only, and "\t<source>"
+        emails: dict[bytes, str] = {}
+        authors: list[str] = []
+        commit = None
+        header = True
+        for line in output.split(b"\n"):
+            if header:
+                commit = line.split(b" ", 1)[0]
+                header = False
+            elif line.startswith(b"\t"):
+                authors.append(emails[commit])
+                header = True
+            elif line.startswith(b"author-mail "):
+                emails[commit] = line[len(b"author-mail "):].decode('utf-8', 'ignore').strip("<>")
+        return authors
+
+    def _incremental_blame(self, parent_authors: List[str], change: FileChange, author_email: str) -> Optional[List[str]]:
+        # Lines out of the hunks keep the blame of the parent commit, lines of the hunks are authored by the commit
+        output = self._git(['diff', '-U0', '--text', '--no-color', '--no-ext-diff', change.old_blob, change.new_blob])
+        if output is None:
+            return None
+        with self.lock:
+            self.incremental_blames += 1
+
+        authors: list[str] = []
+        kept = 0
+        for line in output.split(b"\n"):
+            match = self.HUNK.match(line)
+            if match is None:
+                continue
+            old_start, old_count = int(match.group(1)), int(match.group(2) or 1)
+            new_count = int(match.group(4) or 1)
+            # A hunk without old lines is inserted after its start line
+            old_start = old_start - 1 if old_count != 0 else old_start
+            if old_start < kept or old_start + old_count > len(parent_authors):
+                return None
+            authors.extend(parent_authors[kept:old_start])
+            authors.extend([author_email] * new_count)
+            kept = old_start + old_count
+        authors.extend(parent_authors[kept:])
+        return authors
+
+    def blame(self, record: CommitRecord, change: FileChange, full: bool = True) -> Optional[List[str]]:
+        # Deleted files have no lines at the commit
+        if change.new_path is None or change.new_blob is None:
+            return None
+        key = (change.new_path, record.hash)
+        authors = self._cached(key)
+        if authors is not None:
+            return authors
+
+        if change.change_type == "A":
+            # Every line of an added file is authored by the commit, as git blame does without copy detection
+            data = self.blob_reader.read(change.new_blob)
+            if data is not None:
+                authors = [record.blame_email] * (data.count(b"\n") + (1 if data and not data.endswith(b"\n") else 0))
+        elif len(record.parents) == 1 and change.old_path is not None and change.old_blob is not None:
+            parent_authors = self._base(record, change)
+            if parent_authors is not None:
+                authors = self._incremental_blame(parent_authors, change, record.blame_email)
+        if authors is None and full:
+            authors = self._full_blame(record.hash, change.new_path)
+
+        if authors is not None:
+            self._store(record, change, authors)
+        return authors
+
+    def track(self, record: CommitRecord, changes: List[FileChange]) -> None:
+        # Commits that are not analyzed only carry the known blames forward, files without a known blame stay unknown
+        tracked = []
+        with self.lock:
+            for change in changes:
+                latest = self.latest.get(change.old_path) if change.old_path is not None else None
+                if change.change_type == "A" or (latest is not None and latest[1] == change.old_blob and change.new_path is not None):
+                    tracked.append(change)
+                elif latest is not None:
+                    # Deleted, or changed by a commit that was not traversed
+                    del self.latest[change.old_path]
+        for future in [self.executor.submit(self.blame, record, change, False) for change in tracked]:
+            future.result()
+
+    def get_process_metrics(self, record: CommitRecord, change: FileChange) -> Optional[Dict[str, float]]:
+        authors = self.blame(record, change)
+        if authors is None:
+            return None
+        # Distinct authors of the file lines, and % of the file lines last modified by the commit author, both with the identities of .mailmap
+        authored_line_count = sum(1 for author in authors if author == record.blame_email)
+        return {"blame_authors": len(set(authors)), "blame_ownership": authored_line_count / len(authors) * 100 if authors else 0}
+
+    def submit_process_metrics(self, record: CommitRecord, changes: List[FileChange]) -> List[Future]:
+        # Files of the same commit never depend on each other, the blame of their parents is already cached, if any
+        return [self.executor.submit(self.get_process_metrics, record, change) for change in changes]
+
+    def stats(self) -> str:
+        return "{} full blames, {} incremental blames, {} cached files".format(self.full_blames, self.incremental_blames, len(self.cache))
+
+    def close(self) -> None:
+        self.executor.shutdown()
+        with self.lock:
+            self.cache.clear()
+            self.cached_lines = 0
+            self.latest.clear()
@@ -1,7 +1,21 @@
+import os
+import bisect
+import difflib
+import json
+import math
+import hashlib
+import queue
 import subprocess
 import re
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 from enum import Enum
+from itertools import count
+from threading import Lock, Thread, local
 from typing import Tuple, List, Dict, Optional
+import numpy as np
+from cache import SqliteLruCache
 
 
 class MetricType(Enum):
@@ -13,89 +27,437 @@ class MetricType(Enum):
     NOR = 1
 
 
+class ReadabilityRun:
+    # Output of one run of the tool, with the seconds of the run alone, i.e., neither the wait for a worker nor the JVM startup of a worker
+    def __init__(self, stdout: Optional[str] = None, stderr: Optional[str] = None, seconds: float = 0.0, timed_out: bool = False):
+        self.stdout = stdout
+        self.stderr = stderr
+        self.seconds = seconds
+        self.timed_out = timed_out
+
+
+class ReadabilityWorker:
+    READY = "<<<READABILITY-READY>>>"
+    ERR = "<<<READABILITY-ERR>>>"
+    END = "<<<READABILITY-END>>>"
+
+    # Java 11+ single-file source launcher, compiled in memory against rsm.jar
+    WORKER_SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "readability", "ReadabilityWorker.java")
+
+    def __init__(self, readability_tool: str, seconds_timeout: int, startup_timeout: int = 120):
+        self.readability_tool = readability_tool
+        self.timeout = seconds_timeout
+        self.startup_timeout = startup_timeout
+        self.process = None
+        self.lines = None
+
+    def start(self) -> bool:
+        command = ['java', '-cp', self.readability_tool, self.WORKER_SOURCE]
+        try:
+            self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        except OSError as exception:
+            print("Cannot start readability worker: {}".format(exception))
+            self.process = None
+            return False
+
+        # A reader thread turns the blocking stdout into a queue, so that every read can time out
+        self.lines = queue.Queue()
+        Thread(target=self._read_lines, args=(self.process.stdout, self.lines), daemon=True).start()
+
+        if self._read_until(self.READY, self.startup_timeout) is None:
+            self.stop()
+            return False
+        return True
+
+    def stop(self) -> None:
+        if self.process is not None:
+            self.process.kill()
+            self.process.wait()
+            self.process = None
+
+    def is_alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    @staticmethod
+    def _read_lines(stream, lines: queue.Queue) -> None:
+        for line in stream:
+            lines.put(line)
+        # End of stream, the JVM exited
+        lines.put(None)
+
+    def _read_until(self, sentinel: str, seconds_timeout: float) -> Optional[List[bytes]]:
+        deadline = time.monotonic() + seconds_timeout
+        collected: list[bytes] = []
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            try:
+                line = self.lines.get(timeout=remaining)
+            except queue.Empty:
+                return None
+            if line is None:
+                return None
+            if line.rstrip(b"\r\n") == sentinel.encode():
+                return collected
+            collected.append(line)
+
+    def run(self, filename: str) -> ReadabilityRun:
+        if not self.is_alive() and not self.start():
+            return ReadabilityRun()
+
+        start = time.monotonic()
+        try:
+            self.process.stdin.write((filename + "\n").encode('utf-8'))
+            self.process.stdin.flush()
+        except OSError:
+            self.stop()
+            return ReadabilityRun()
+
+        lines = self._read_until(self.END, self.timeout)
+        seconds = time.monotonic() - start
+        if lines is None:
+            # Either crashed or timed out, the next run restarts a fresh JVM
+            self.stop()
+            return ReadabilityRun(seconds=seconds, timed_out=seconds >= self.timeout)
+
+        try:
+            output = b"".join(lines).decode('utf-8')
+        except UnicodeDecodeError:
+            print("UnicodeDecodeError: 'utf-8' codec can't decode byte")
+            return ReadabilityRun(seconds=seconds)
+        stdout, _, stderr = output.partition(self.ERR + "\n")
+        return ReadabilityRun(stdout, stderr, seconds)
+
+
+class ReadabilityWorkerPool:
+    def __init__(self, readability_tool: str, size: int, seconds_timeout: int):
+        self.enabled = True
+        self.workers = [ReadabilityWorker(readability_tool, seconds_timeout) for _ in range(size)]
+        self.idle = queue.Queue()
+        for worker in self.workers:
+            self.idle.put(worker)
+
+    def run(self, filename: str) -> ReadabilityRun:
+        worker = self.idle.get()
+        try:
+            if not worker.is_alive() and not worker.start():
+                # The JVM cannot even start (e.g., Java < 11 has no source launcher), stop using the pool
+                print("Readability worker unavailable, falling back to one JVM per file")
+                self.enabled = False
+                return ReadabilityRun()
+            return worker.run(filename)
+        finally:
+            self.idle.put(worker)
+
+    def close(self) -> None:
+        for worker in self.workers:
+            worker.stop()
+
+
+class JavaSnippets:
+    # Comments, text blocks, strings, and char literals, their braces and keywords are not code
+    NOT_CODE = re.compile(r'//[^\n]*|/\*.*?\*/|"""[\s\S]*?"""|"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\'', re.DOTALL)
+    # Header of a block holding members, i.e., a type declaration or an anonymous class
+    TYPE_HEADER = re.compile(r"(?<![.\w])(?:class|interface|enum|record)\s+\w|(?<![.\w])new\s")
+    # Braces and semicolons bound blocks and declarations, parentheses enclose arguments whose braces are expressions
+    BLOCK_BOUNDARY = re.compile(r"[{};()]")
+
+    @classmethod
+    def mask(cls, source: str) -> str:
+        # Same offsets and lines of the source, with blanks in place of everything that is not code
+        return cls.NOT_CODE.sub(lambda match: re.sub(r"[^\n]", " ", match.group()), source)
+
+    @classmethod
+    def members(cls, source: str) -> List[Tuple[int, int]]:
+        # Offsets of the blocks declared in a type body, i.e., methods, constructors, and initializers, with their comments and annotations
+        masked = cls.mask(source)
+        spans = []
+        stack: list[Tuple[bool, Optional[int]]] = []
+        header_start = 0
+        paren_depth = 0
+        for match in cls.BLOCK_BOUNDARY.finditer(masked):
+            position = match.start()
+            if match.group() == "(":
+                paren_depth += 1
+                continue
+            if match.group() == ")":
+                paren_depth = max(0, paren_depth - 1)
+                continue
+            if paren_depth > 0:
+                # Annotation arrays, lambdas, and anonymous classes passed as arguments belong to the enclosing declaration
+                continue
+            if match.group() == "{":
+                is_type = cls.TYPE_HEADER.search(masked, header_start, position) is not None
+                member_start = None
+                # Initializers of fields, e.g., arrays, lambdas, and switch expressions, and annotation element defaults are expressions, not members
+                if stack and stack[-1][0] and not is_type and not cls.is_expression(masked[header_start:position]):
+                    member_start = position - len(source[header_start:position].lstrip())
+                stack.append((is_type or not stack, member_start))
+            elif match.group() == "}" and stack:
+                _, member_start = stack.pop()
+                if member_start is not None:
+                    spans.append((member_start, position + 1))
+            header_start = position + 1
+        return spans
+
+    @staticmethod
+    def is_expression(header: str) -> bool:
+        # Annotation arguments and parameters may hold "=", only what is out of their parentheses tells an expression
+        outside = []
+        depth = 0
+        for character in header:
+            if character == "(":
+                depth += 1
+            elif character == ")":
+                depth = max(0, depth - 1)
+            elif depth == 0:
+                outside.append(character)
+        outside = "".join(outside).rstrip()
+        # A default method starts with default, an annotation element default ends with it
+        return "=" in outside or outside.endswith("->") or re.search(r"(?<![\w$])default$", outside) is not None
+
+    @staticmethod
+    def changed_lines(source_before: str, source_current: str) -> Tuple[set, set]:
+        # Line indexes changed on each side, an insertion or a deletion touches the line at its position on the other side
+        lines_before, lines_current = set(), set()
+        matcher = difflib.SequenceMatcher(None, source_before.splitlines(), source_current.splitlines())
+        for tag, before_start, before_end, current_start, current_end in matcher.get_opcodes():
+            if tag != "equal":
+                lines_before.update(range(before_start, max(before_end, before_start + 1)))
+                lines_current.update(range(current_start, max(current_end, current_start + 1)))
+        return lines_before, lines_current
+
+    @classmethod
+    def extract(cls, source: str, lines: set) -> Optional[str]:
+        # Members enclosing the given lines, wrapped in a class to keep the snippet a compilation unit
+        line_starts = [0] + [match.end() for match in re.finditer("\n", source)]
+        selected = []
+        for start, end in sorted(cls.members(source)):
+            # Members of local and anonymous classes are already in the enclosing member
+            if selected and start < selected[-1][1]:
+                continue
+            first_line, last_line = bisect.bisect_right(line_starts, start) - 1, bisect.bisect_right(line_starts, end - 1) - 1
+            if any(line in lines for line in range(first_line, last_line + 1)):
+                selected.append((start, end))
+        if not selected:
+            return None
+        return "class Snippet {\n" + "\n\n".join(source[start:end] for start, end in selected) + "\n}\n"
+
+
+class ReadabilityQuarantine:
+    # Sources whose readability timed out, later runs skip them unless their timeout is longer. One "<blob hash> <timeout>" per line
+    def __init__(self, filename: Optional[str]):
+        self.filename = filename
+        self.entries: dict[str, int] = {}
+        self.lock = Lock()
+        if filename is not None and os.path.isfile(filename):
+            with open(filename, 'r') as file:
+                for line in file:
+                    fields = line.split()
+                    if len(fields) == 2:
+                        self.entries[fields[0]] = max(int(fields[1]), self.entries.get(fields[0], 0))
+
+    def get(self, key: str) -> Optional[int]:
+        with self.lock:
+            return self.entries.get(key)
+
+    def add(self, key: str, seconds_timeout: int) -> None:
+        with self.lock:
+            self.entries[key] = max(seconds_timeout, self.entries.get(key, 0))
+            # Appended at once, processes sharing the file do not interleave their lines
+            if self.filename is not None:
+                with open(self.filename, 'a') as file:
+                    file.write("{} {}\n".format(key, seconds_timeout))
+
+
+class ReadabilityCostModel:
+    # Seconds the next evaluation of every blob evaluated so far takes, the mean runtime per byte estimates the blobs never evaluated
+    MAX_BLOBS = 64 * 1024
+
+    def __init__(self):
+        self.lock = Lock()
+        self.blobs: OrderedDict[str, float] = OrderedDict()
+        self.total_bytes = 0
+        self.total_seconds = 0.0
+
+    def observe(self, blob: str, size: int, seconds: float, next_seconds: float) -> None:
+        with self.lock:
+            self.total_bytes += size
+            self.total_seconds += seconds
+            self.blobs[blob] = next_seconds
+            self.blobs.move_to_end(blob)
+            while len(self.blobs) > self.MAX_BLOBS:
+                self.blobs.popitem(last=False)
+
+    def estimate(self, blob: str, size: int) -> float:
+        with self.lock:
+            seconds = self.blobs.get(blob)
+            if seconds is not None:
+                return seconds
+            # Before any runtime is known, the size alone orders the blobs
+            return size * self.total_seconds / self.total_bytes if self.total_seconds > 0 else float(size)
+
+
 class Readability:
-    def __init__(self, readability_tool: str, temp_filename: str, seconds_timeout: int):
+    def __init__(self, readability_tool: str, temp_filename: str, seconds_timeout: int, worker_count: int = 0,
+                 cache: Optional[SqliteLruCache] = None, scope: str = "file", max_bytes: int = 0, max_lines: int = 0,
+                 quarantine: Optional[ReadabilityQuarantine] = None):
         self.exception = None
+        # Whole files, or only the methods enclosing the changed lines
+        self.scope = scope
+        # Size caps of the evaluated sources, 0 disables them
+        self.max_bytes = max_bytes
+        self.max_lines = max_lines
+        self.quarantine = quarantine if quarantine is not None else ReadabilityQuarantine(None)
+        self.cost_model = ReadabilityCostModel()
         self.readability_tool = readability_tool
         self.temp_filename = temp_filename
         self.timeout = seconds_timeout  # 60 * 60 * 1  # 1 hour
+        # Resident JVMs avoid paying the JVM startup and the classifier loading for every file
+        self.worker_pool = ReadabilityWorkerPool(readability_tool, worker_count, seconds_timeout) if worker_count > 0 else None
+        # Metrics are keyed by source blob hash and tool version, a different rsm.jar never reuses stale entries
+        self.cache = cache
+        self.tool_version = self.hash_file(readability_tool) if cache is not None else None
+        # Every thread writes its snapshots to its own temp file
+        self.thread_data = local()
+        self.thread_counter = count()
+
+    def close(self) -> None:
+        if self.worker_pool is not None:
+            self.worker_pool.close()
+        if self.cache is not None:
+            print("Readability cache: {}".format(self.cache.stats()))
+            self.cache.close()
 
-    def get_delta(self, source_before: str, source_current: str) -> Optional[Dict[str, Tuple[float, float, float]]]:
+    @staticmethod
+    def hash_file(filename: str) -> str:
+        sha = hashlib.sha1()
+        with open(filename, 'rb') as file:
+            for chunk in iter(lambda: file.read(1 << 20), b""):
+                sha.update(chunk)
+        return sha.hexdigest()
+
+    @staticmethod
+    def hash_blob(source: bytes) -> str:
+        # Same hash git assigns to the blob, i.e., the key is shared by every commit having this file content
+        return hashlib.sha1(b"blob " + str(len(source)).encode() + b"\0" + source).hexdigest()
+
+    def get_temp_filename(self) -> str:
+        if not hasattr(self.thread_data, "temp_filename"):
+            index = next(self.thread_counter)
+            root, extension = os.path.splitext(self.temp_filename)
+            # The first thread keeps the configured name, the others get an indexed sibling
+            self.thread_data.temp_filename = self.temp_filename if index == 0 else "{}_{}{}".format(root, index, extension)
+        return self.thread_data.temp_filename
+
+    def get_readability(self, source: str) -> Optional[Dict[str, Tuple[float, float, float]]]:
+        blob = self.hash_blob(source.encode('utf-8'))
+        key = None
+        if self.cache is not None:
+            key = "{}:{}".format(self.tool_version, blob)
+            value = self.cache.get(key)
+            if value is not None:
+                return {k: tuple(v) for k, v in json.loads(value).items()}
+
+        temp_filename = self.get_temp_filename()
+        file = open(temp_filename, 'w')
+        file.write(source)
+        file.close()
+        run = self.run_extract_metrics(temp_filename)
+        readability = self.parse_extended(run)
+        if run.timed_out:
+            self.quarantine.add(blob, self.timeout)
+        # Cached and quarantined blobs cost nothing the next time, the others are run again
+        cached = readability is not None and self.cache is not None
+        self.cost_model.observe(blob, len(source), run.seconds, 0.0 if cached or run.timed_out else run.seconds)
+
+        # Failures are not cached, they are retried on the next run. Timeouts are quarantined instead
+        if key is not None and readability is not None:
+            self.cache.put(key, json.dumps(readability).encode('utf-8'))
+        return readability
+
+    def estimate(self, source_before: Optional[str], source_current: Optional[str]) -> float:
+        # Seconds of a delta, the source before is usually the current source of an earlier commit, its runtime is already known
+        return sum(self.cost_model.estimate(self.hash_blob(source.encode('utf-8')), len(source)) for source in (source_before, source_current) if source)
+
+    def skip_reason(self, source: str) -> Optional[str]:
+        data = source.encode('utf-8')
+        if 0 < self.max_bytes < len(data):
+            return "{} bytes, over the {} bytes cap".format(len(data), self.max_bytes)
+        line_count = source.count("\n") + 1
+        if 0 < self.max_lines < line_count:
+            return "{} lines, over the {} lines cap".format(line_count, self.max_lines)
+        timeout = self.quarantine.get(self.hash_blob(data))
+        if timeout is not None and timeout >= self.timeout:
+            return "quarantined, it timed out after {} s".format(timeout)
+        return None
+
+    def get_delta(self, source_before: str, source_current: str) -> Tuple[Optional[np.ndarray], Optional[str]]:
+        # The delta, or None with the reason the tool has not been run, if any
         if source_before is not None and source_before:
             if source_current is not None and source_current:
+                if self.scope == "method":
+                    # Whole files when a side has no changed method, e.g., only imports or fields changed
+                    lines_before, lines_current = JavaSnippets.changed_lines(source_before, source_current)
+                    snippet_before = JavaSnippets.extract(source_before, lines_before)
+                    snippet_current = JavaSnippets.extract(source_current, lines_current)
+                    if snippet_before is not None and snippet_current is not None:
+                        source_before, source_current = snippet_before, snippet_current
+
+                # Caps and quarantine are checked before running the tool on any side
+                for source in (source_before, source_current):
+                    reason = self.skip_reason(source)
+                    if reason is not None:
+                        return None, reason
+
                 # Get readability before
-                file = open(self.temp_filename, 'w')
-                file.write(source_before)
-                file.close()
-                readability_before = self.run_readability_extended(self.temp_filename)
+                readability_before = self.get_readability(source_before)
 
                 # Get readability current
-                file = open(self.temp_filename, 'w')
-                file.write(source_current)
-                file.close()
-                readability_current = self.run_readability_extended(self.temp_filename)
+                readability_current = self.get_readability(source_current) if readability_before is not None else None
 
                 if readability_before is not None and readability_current is not None:
-                    return self.calculate_diff(readability_before, readability_current)
+                    return self.calculate_diff(readability_before, readability_current), None
+                # A side that has just timed out is now quarantined
+                for source in (source_before, source_current):
+                    timeout = self.quarantine.get(self.hash_blob(source.encode('utf-8')))
+                    if timeout is not None and timeout >= self.timeout:
+                        return None, "timed out after {} s".format(self.timeout)
 
-        return None
+        return None, None
 
-    def expand_dictionary(self, metrics: Dict[str, Tuple[float, float, float]]) -> Dict[str, float]:
-        # return {"CIC_AVG": str(metrics["CIC"][MetricType.AVG.value]),
-        #         "CIC_MAX": str(metrics["CIC"][MetricType.MAX.value]),
-        #
-        #         "CIC_syn_AVG": str(metrics["CIC"][MetricType.AVG.value]),
-        #         "CIC_syn_MAX": str(metrics["CIC"][MetricType.MAX.value]),
-        #
-        #         "ITID_MIN": str(metrics["CIC"][MetricType.MIN.value]),
-        #         "ITID_AVG": str(metrics["CIC"][MetricType.AVG.value]),
-        #
-        #         "NMI_MIN": str(metrics["CIC"][MetricType.MIN.value]),
-        #         "NMI_AVG": str(metrics["CIC"][MetricType.AVG.value]),
-        #         "NMI_MAX": str(metrics["CIC"][MetricType.MAX.value]),
-        #
-        #         "CR": str(metrics["CIC"][0]),
-        #
-        #         "NM_AVG": str(metrics["CIC"][MetricType.AVG.value]),
-        #         "NM_MAX": str(metrics["CIC"][MetricType.MAX.value]),
-        #
-        #         "TC_MIN": str(metrics["CIC"][MetricType.MIN.value]),
-        #         "TC_AVG": str(metrics["CIC"][MetricType.AVG.value]),
-        #         "TC_MAX": str(metrics["CIC"][MetricType.MAX.value]),
-        #
-        #         "NOC_STD": str(metrics["CIC"][MetricType.STD.value]),
-        #         "NOC_NOR": str(metrics["CIC"][MetricType.NOR.value])}
-        return {"CIC_AVG": metrics["CIC"][MetricType.AVG.value],
-                "CIC_MAX": metrics["CIC"][MetricType.MAX.value],
-
-                "CIC_syn_AVG": metrics["CIC"][MetricType.AVG.value],
-                "CIC_syn_MAX": metrics["CIC"][MetricType.MAX.value],
-
-                "ITID_MIN": metrics["CIC"][MetricType.MIN.value],
-                "ITID_AVG": metrics["CIC"][MetricType.AVG.value],
-
-                "NMI_MIN": metrics["CIC"][MetricType.MIN.value],
-                "NMI_AVG": metrics["CIC"][MetricType.AVG.value],
-                "NMI_MAX": metrics["CIC"][MetricType.MAX.value],
-
-                "CR": metrics["CIC"][0],
-
-                "NM_AVG": metrics["CIC"][MetricType.AVG.value],
-                "NM_MAX": metrics["CIC"][MetricType.MAX.value],
-
-                "TC_MIN": metrics["CIC"][MetricType.MIN.value],
-                "TC_AVG": metrics["CIC"][MetricType.AVG.value],
-                "TC_MAX": metrics["CIC"][MetricType.MAX.value],
-
-                "NOC_STD": metrics["CIC"][MetricType.STD.value],
-                "NOC_NOR": metrics["CIC"][MetricType.NOR.value]}
-
-    def run_command(self, command: List[str]) -> Tuple[Optional[str], Optional[str]]:
+    def expand_dictionary(self, vector: np.ndarray, suffix: str = "") -> Dict[str, Optional[float]]:
+        # Rows are only turned into dictionaries when written, NaN is a missing value
+        return {name + suffix: None if math.isnan(value) else value for name, value in zip(self.measure_list(), vector.tolist())}
+
+    @classmethod
+    def aggregate_list(cls, aggregates: List[str]) -> List[str]:
+        # The mean keeps the measure names, the other aggregates are suffixed
+        return [name + ("" if aggregate == "mean" else "_" + aggregate) for aggregate in aggregates for name in cls.measure_list()]
+
+    def aggregate(self, deltas: List[np.ndarray], aggregates: List[str]) -> Dict[str, Optional[float]]:
+        # Files x measures matrix of a commit, every aggregate skips the missing values of a measure and is missing when all of them are
+        matrix = np.vstack(deltas) if deltas else np.full((0, len(self.MEASURES)), np.nan)
+        result = {}
+        for aggregate in aggregates:
+            if aggregate == "mean":
+                counts = np.count_nonzero(~np.isnan(matrix), axis=0)
+                vector = np.divide(np.nansum(matrix, axis=0), counts, out=np.full(counts.shape, np.nan), where=counts != 0)
+            elif aggregate == "min":
+                vector = np.fmin.reduce(matrix, axis=0, initial=np.nan)
+            else:
+                vector = np.fmax.reduce(matrix, axis=0, initial=np.nan)
+            result.update(self.expand_dictionary(vector, "" if aggregate == "mean" else "_" + aggregate))
+        return result
+
+    def run_command(self, command: List[str]) -> ReadabilityRun:
+        start = time.monotonic()
         try:
             shell_result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=self.timeout)
             stdout = shell_result.stdout.decode('utf-8')
             stderr = shell_result.stderr.decode('utf-8')
-            return stdout, stderr
+            return ReadabilityRun(stdout, stderr, time.monotonic() - start)
         except UnicodeDecodeError as exception:
             self.exception = exception
             print("UnicodeDecodeError: 'utf-8' codec can't decode byte")
@@ -105,11 +467,13 @@ class Readability:
         except subprocess.TimeoutExpired as exception:
             self.exception = exception
             # print("Caught timeout exception: Readability tool timeout >{} minutes".format(timeout/60))
-        return None, None
+            return ReadabilityRun(seconds=time.monotonic() - start, timed_out=True)
+        return ReadabilityRun(seconds=time.monotonic() - start)
 
     def run_readability_simple(self, filename: str) -> float:
         command = ['java', '-jar', self.readability_tool, filename]
-        out, err = self.run_command(command)
+        run = self.run_command(command)
+        out, err = run.stdout, run.stderr
 
         if out is not None and err is not None:
             if "File not found:" in err:
@@ -124,9 +488,20 @@ class Readability:
                     return readability
         return 0
 
-    def run_readability_extended(self, filename: str) -> Optional[Dict[str, Tuple[float, float, float]]]:
+    def run_extract_metrics(self, filename: str) -> ReadabilityRun:
+        if self.worker_pool is not None and self.worker_pool.enabled:
+            run = self.worker_pool.run(filename)
+            if self.worker_pool.enabled:
+                return run
+
         command = ['java', '-cp', self.readability_tool, 'it.unimol.readability.metric.runnable.ExtractMetrics', filename]
-        out, err = self.run_command(command)
+        return self.run_command(command)
+
+    def run_readability_extended(self, filename: str) -> Optional[Dict[str, Tuple[float, float, float]]]:
+        return self.parse_extended(self.run_extract_metrics(filename))
+
+    def parse_extended(self, run: ReadabilityRun) -> Optional[Dict[str, Tuple[float, float, float]]]:
+        out, err = run.stdout, run.stderr
 
         if out is not None and err is not None:
             if "File not found:" in err:
@@ -188,20 +563,46 @@ class Readability:
             return float(reg_res.group(1))
         return None
 
-    @staticmethod
-    def calculate_diff(r1: Dict[str, Tuple[float, float, float]], r2: Dict[str, Tuple[float, float, float]]) -> Dict[str, Tuple[float, float, float]]:
-        rtn = {}
-        for (k1, v1), (k2, v2) in zip(r1.items(), r2.items()):
-            rtn[k1] = tuple(map(lambda t1, t2: None if t1 is None or t2 is None else t1 - t2, v1, v2))
-        return rtn
-
-    @staticmethod
-    def measure_list() -> List[str]:
-        return ["CIC_AVG", "CIC_MAX",
-                "CIC_syn_AVG", "CIC_syn_MAX",
-                "ITID_MIN", "ITID_AVG",
-                "NMI_MIN", "NMI_AVG", "NMI_MAX",
-                "CR",
-                "NM_AVG", "NM_MAX",
-                "TC_MIN", "TC_AVG", "TC_MAX",
-                "NOC_STD", "NOC_NOR"]
+    # Result columns, with the metric and the position of the value they take
+    MEASURES = [("CIC_AVG", "CIC", MetricType.AVG.value), ("CIC_MAX", "CIC", MetricType.MAX.value),
+                ("CIC_syn_AVG", "CIC_syn", MetricType.AVG.value), ("CIC_syn_MAX", "CIC_syn", MetricType.MAX.value),
+                ("ITID_MIN", "ITID", MetricType.MIN.value), ("ITID_AVG", "ITID", MetricType.AVG.value),
+                ("NMI_MIN", "NMI", MetricType.MIN.value), ("NMI_AVG", "NMI", MetricType.AVG.value), ("NMI_MAX", "NMI", MetricType.MAX.value),
+                ("CR", "CR", 0),
+                ("NM_AVG", "NM", MetricType.AVG.value), ("NM_MAX", "NM", MetricType.MAX.value),
+                ("TC_MIN", "TC", MetricType.MIN.value), ("TC_AVG", "TC", MetricType.AVG.value), ("TC_MAX", "TC", MetricType.MAX.value),
+                ("NOC_STD", "NOC", MetricType.STD.value), ("NOC_NOR", "NOC", MetricType.NOR.value)]
+
+    @classmethod
+    def to_vector(cls, metrics: Dict[str, Tuple[float, ...]]) -> np.ndarray:
+        return np.array([metrics[metric][index] if metrics[metric][index] is not None else np.nan for _, metric, index in cls.MEASURES],
+                        dtype=np.float64)
+
+    @classmethod
+    def calculate_diff(cls, r1: Dict[str, Tuple[float, ...]], r2: Dict[str, Tuple[float, ...]]) -> np.ndarray:
+        return cls.to_vector(r1) - cls.to_vector(r2)
+
+    @classmethod
+    def measure_list(cls) -> List[str]:
+        return [name for name, _, _ in cls.MEASURES]
+
+
+class ReadabilityExecutor:
+    def __init__(self, readability: Readability, max_workers: int):
+        self.readability = readability
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="readability")
+
+    def submit_deltas(self, pairs: List[Tuple[str, str]]) -> List[Future]:
+        # Schedule all (before, current) pairs at once, e.g., the files of a commit or of a window of commits. Longest jobs start first,
+        # a long one started last would keep the whole batch waiting
+        futures: list[Optional[Future]] = [None] * len(pairs)
+        for index in sorted(range(len(pairs)), key=lambda x: self.readability.estimate(*pairs[x]), reverse=True):
+            futures[index] = self.executor.submit(self.readability.get_delta, *pairs[index])
+        return futures
+
+    def get_deltas(self, pairs: List[Tuple[str, str]]) -> List[Tuple[Optional[np.ndarray], Optional[str]]]:
+        # Results follow the order of the pairs, whatever the completion order is
+        return [future.result() for future in self.submit_deltas(pairs)]
+
+    def close(self) -> None:
+        self.executor.shutdown()
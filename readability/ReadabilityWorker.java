@@ -0,0 +1,47 @@
+import java.io.BufferedReader;
+import java.io.ByteArrayOutputStream;
+import java.io.FileDescriptor;
+import java.io.FileOutputStream;
+import java.io.IOException;
+import java.io.InputStreamReader;
+import java.io.PrintStream;
+import java.nio.charset.StandardCharsets;
+
+import it.unimol.readability.metric.runnable.ExtractMetrics;
+
+/**
+ * Resident ExtractMetrics runner. It reads one file name per line from stdin and answers with the
+ * ExtractMetrics output, the sentinel ERR line, the ExtractMetrics errors, and the sentinel END line.
+ * Launch it with the Java 11+ source launcher: java -cp rsm.jar ReadabilityWorker.java
+ */
+public class ReadabilityWorker {
+    private static final String READY = "<<<READABILITY-READY>>>";
+    private static final String ERR = "<<<READABILITY-ERR>>>";
+    private static final String END = "<<<READABILITY-END>>>";
+
+    public static void main(String[] args) throws IOException {
+        PrintStream protocol = new PrintStream(new FileOutputStream(FileDescriptor.out), true, "UTF-8");
+        BufferedReader in = new BufferedReader(new InputStreamReader(System.in, StandardCharsets.UTF_8));
+        protocol.println(READY);
+
+        String filename;
+        while ((filename = in.readLine()) != null) {
+            ByteArrayOutputStream out = new ByteArrayOutputStream();
+            ByteArrayOutputStream err = new ByteArrayOutputStream();
+            System.setOut(new PrintStream(out, true, "UTF-8"));
+            System.setErr(new PrintStream(err, true, "UTF-8"));
+            try {
+                ExtractMetrics.main(new String[]{filename});
+            } catch (Throwable t) {
+                t.printStackTrace(System.err);
+            }
+            System.out.flush();
+            System.err.flush();
+
+            protocol.println(out.toString("UTF-8"));
+            protocol.println(ERR);
+            protocol.println(err.toString("UTF-8"));
+            protocol.println(END);
+        }
+    }
+}
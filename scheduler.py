@@ -0,0 +1,100 @@
+import multiprocessing
+import multiprocessing.util
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Any, Callable, Iterable, List, Tuple
+
+# Per-process state of the pool workers, built once by _init_worker
+_worker_context = None
+_worker_io = None
+
+
+class ProjectStatus:
+    def __init__(self, index: int, name: str, status: str, seconds: float):
+        self.index = index
+        self.name = name
+        self.status = status
+        self.seconds = seconds
+
+
+def _init_worker(slots, slot_count: int, io_semaphore, setup: Callable, setup_args: tuple) -> None:
+    global _worker_context, _worker_io
+    # Every process takes a distinct slot, i.e., a distinct share of the global budgets
+    _worker_context = setup(slots.get(), slot_count, *setup_args)
+    _worker_io = io_semaphore
+    # Closed when the pool shuts the process down, pool processes leave without running atexit handlers
+    multiprocessing.util.Finalize(None, _worker_context.close, exitpriority=10)
+
+
+def _run_task(function: Callable, index: int, name: str, args: tuple) -> ProjectStatus:
+    return ProjectScheduler.run_task(function, _worker_context, _worker_io, index, name, args)
+
+
+class ProjectScheduler:
+    def __init__(self, max_projects: int, io_budget: int):
+        self.max_projects = max(1, max_projects)
+        self.io_budget = max(1, io_budget)
+
+    @staticmethod
+    def share(budget: int, slot_count: int, slot: int) -> int:
+        # Split a global budget among slots, a non-empty budget always grants at least one unit
+        if budget <= 0:
+            return budget
+        return max(1, budget // slot_count + (1 if slot < budget % slot_count else 0))
+
+    @staticmethod
+    def share_list(items: List[Any], slot_count: int, slot: int) -> List[Any]:
+        if len(items) >= slot_count:
+            return items[slot::slot_count]
+        # Fewer items than slots, some slots share the same item
+        return [items[slot % len(items)]] if items else []
+
+    @staticmethod
+    def run_task(function: Callable, context: Any, io_semaphore, index: int, name: str, args: tuple) -> ProjectStatus:
+        start = time.monotonic()
+        try:
+            status = function(context, io_semaphore, *args)
+        except Exception as exception:
+            status = "failed: {}".format(repr(exception))
+        return ProjectStatus(index, name, status, time.monotonic() - start)
+
+    def run(self, setup: Callable, setup_args: tuple, function: Callable, tasks: Iterable[Tuple[str, tuple]]) -> List[ProjectStatus]:
+        # setup(slot, slot_count, *setup_args) builds the per-slot context passed to function(context, io_semaphore, *task_args)
+        if self.max_projects == 1:
+            return self._run_sequential(setup, setup_args, function, tasks)
+        return self._run_parallel(setup, setup_args, function, tasks)
+
+    def _run_sequential(self, setup: Callable, setup_args: tuple, function: Callable, tasks: Iterable[Tuple[str, tuple]]) -> List[ProjectStatus]:
+        context = setup(0, 1, *setup_args)
+        io_semaphore = threading.BoundedSemaphore(self.io_budget)
+        try:
+            return [self.run_task(function, context, io_semaphore, index, name, args) for index, (name, args) in enumerate(tasks)]
+        finally:
+            context.close()
+
+    def _run_parallel(self, setup: Callable, setup_args: tuple, function: Callable, tasks: Iterable[Tuple[str, tuple]]) -> List[ProjectStatus]:
+        mp_context = multiprocessing.get_context()
+        slots = mp_context.Queue()
+        for slot in range(self.max_projects):
+            slots.put(slot)
+        io_semaphore = mp_context.BoundedSemaphore(self.io_budget)
+
+        statuses: list[ProjectStatus] = []
+        with ProcessPoolExecutor(max_workers=self.max_projects, mp_context=mp_context, initializer=_init_worker,
+                                 initargs=(slots, self.max_projects, io_semaphore, setup, setup_args)) as executor:
+            pending = set()
+            # Tasks are drawn lazily, only the projects in flight hold their arguments in memory
+            for index, (name, args) in enumerate(tasks):
+                if len(pending) >= self.max_projects:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    statuses.extend(future.result() for future in done)
+                pending.add(executor.submit(_run_task, function, index, name, args))
+            statuses.extend(future.result() for future in wait(pending).done)
+        return sorted(statuses, key=lambda x: x.index)
+
+    @staticmethod
+    def print_summary(statuses: List[ProjectStatus]) -> None:
+        print("Projects summary:")
+        for status in statuses:
+            print("{:>5} {:>10.1f}s {} {}".format(status.index, status.seconds, status.name, status.status))
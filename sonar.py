@@ -0,0 +1,145 @@
+import glob
+import hashlib
+import os
+import pandas as pd
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+# Identifiers repeated on many rows, stored once per distinct value
+SONAR_CATEGORIES = {"analyses": ["organization", "project", "analysis_key"],
+                    "issues": ["organization", "project", "current_analysis_key", "creation_analysis_key", "type", "rule", "severity", "status",
+                               "resolution"],
+                    "measures": ["organization", "project", "analysis_key"]}
+# Text columns, even when their values look like numbers. Any other column is numeric when all of its values are
+SONAR_STRINGS = {"analyses": ["date", "project_version", "revision", "processed", "ingested_at"],
+                 "issues": ["issue_key", "tags", "creation_date", "update_date", "close_date", "processed", "ingested_at"],
+                 "measures": ["function_complexity_distribution", "file_complexity_distribution", "executable_lines_data", "duplications_data",
+                              "quality_profiles", "quality_gate_details", "alert_status", "last_commit_date", "ncloc_data", "comment_lines_data",
+                              "ncloc_language_distribution", "processed", "ingested_at"]}
+# Bump when the ingestion changes, older snapshots are ignored
+SNAPSHOT_VERSION = 1
+
+
+def load_sonar_frame(path: str, kind: str, columns: Optional[List[str]] = None, snapshot: bool = True) -> pd.DataFrame:
+    # kind is one of analyses, issues, or measures. The parsed frame is kept next to the source, keyed by the size and the modification time
+    # of the source and by the selected columns, the next load reads it instead of parsing the CSV again
+    stat = os.stat(path)
+    selection = "all" if columns is None else hashlib.sha1(",".join(columns).encode()).hexdigest()[:12]
+    snapshot_format = "feather" if pyarrow is not None else "pkl"
+    snapshot_prefix = os.path.join(os.path.dirname(path), ".{}.snapshot".format(os.path.basename(path)))
+    snapshot_key = "{}.v{}.{}-{}".format(snapshot_prefix, SNAPSHOT_VERSION, stat.st_size, stat.st_mtime_ns)
+    snapshot_path = "{}.{}.{}".format(snapshot_key, selection, snapshot_format)
+    if snapshot and os.path.exists(snapshot_path):
+        df = pd.read_feather(snapshot_path) if snapshot_format == "feather" else pd.read_pickle(snapshot_path)
+        print("Loaded {} lines of {} from its snapshot".format(len(df.index), path))
+        return df
+
+    categories = SONAR_CATEGORIES[kind]
+    strings = SONAR_STRINGS[kind]
+    if columns is not None:
+        # Identifiers are always needed to join the frames
+        columns = list(dict.fromkeys(categories[:3] + columns))
+        header = pd.read_csv(path, sep=',', nrows=0).columns
+        columns = [column for column in columns if column in header]
+    # Every column as text first, no per-chunk type guessing. Empty cells are NaN
+    df = pd.read_csv(path, sep=',', dtype=str, usecols=columns)
+    orig_len = len(df.index)
+    df = df.drop_duplicates()
+    print("Removed {} duplicated lines of {} from {}".format(orig_len - len(df.index), orig_len, path))
+    # Remove empty columns
+    df = df.dropna(how='all', axis=1)
+
+    for column in df.columns:
+        if column in categories:
+            df[column] = df[column].astype("category")
+        elif column not in strings:
+            try:
+                df[column] = pd.to_numeric(df[column])
+            except (ValueError, TypeError):
+                pass
+    df = df.reset_index(drop=True)
+
+    if snapshot:
+        # Snapshots of older versions of the source are stale, the ones of other column selections are still valid
+        for old_snapshot in glob.glob(glob.escape(snapshot_prefix) + ".*"):
+            if not old_snapshot.startswith(snapshot_key + "."):
+                os.remove(old_snapshot)
+        temp_path = snapshot_path + ".tmp"
+        if snapshot_format == "feather":
+            df.to_feather(temp_path)
+        else:
+            df.to_pickle(temp_path)
+        os.replace(temp_path, snapshot_path)
+    return df
+
+
+class SonarIndex:
+    def __init__(self, dfa: pd.DataFrame, dfm: pd.DataFrame, dfi: pd.DataFrame):
+        self.dfm = dfm
+        self.dfi = dfi
+
+        # (project, revision) -> analysis keys, in the same order of the analyses dataframe. Identifiers may be categorical, only observed values count
+        self.analyses: Dict[Tuple[str, str], List[str]] = {}
+        for key, positions in dfa.groupby(["project", "revision"], sort=False, observed=True).indices.items():
+            self.analyses[key] = dfa["analysis_key"].iloc[positions].tolist()
+
+        # analysis_key -> row positions in the measures and issues dataframes
+        self.measures: Dict[str, List[int]] = self._build_positions(dfm, "analysis_key")
+        self.issues: Dict[str, List[int]] = self._build_positions(dfi, "current_analysis_key")
+
+    @staticmethod
+    def _build_positions(df: pd.DataFrame, column: str) -> Dict[str, List[int]]:
+        return {key: positions.tolist() for key, positions in df.groupby(column, sort=False, observed=True).indices.items()}
+
+    def get_analysis_keys(self, project: str, revision: str) -> List[str]:
+        return self.analyses.get((project, revision), [])
+
+    def get_measure_count(self, analysis_key: Optional[str]) -> int:
+        return len(self.measures.get(analysis_key, []))
+
+    def get_issue_count(self, analysis_key: Optional[str]) -> int:
+        return len(self.issues.get(analysis_key, []))
+
+    def get_measure(self, analysis_key: Optional[str]) -> Optional[Dict[str, str]]:
+        positions = self.measures.get(analysis_key)
+        # sonar_measures.csv may have multiple measures corresponding to the same analysis_key or even zero, take the first one
+        return self.dfm.iloc[[positions[0]]].to_dict('records')[0] if positions else None
+
+    def get_issue(self, analysis_key: Optional[str]) -> Optional[Dict[str, str]]:
+        positions = self.issues.get(analysis_key)
+        return self.dfi.iloc[[positions[0]]].to_dict('records')[0] if positions else None
+
+
+class SonarPartitions:
+    def __init__(self, dfa: pd.DataFrame, dfm: pd.DataFrame, dfi: pd.DataFrame):
+        # One pass per frame, then every project takes its own sub-frames without scanning the whole dataset
+        self.analyses = self._split(dfa)
+        self.measures = self._split(dfm)
+        self.issues = self._split(dfi)
+        self.empty = (dfa.iloc[0:0], dfm.iloc[0:0], dfi.iloc[0:0])
+
+    @staticmethod
+    def _split(df: pd.DataFrame) -> Dict[Tuple[str, str], pd.DataFrame]:
+        partitions = {}
+        for key, positions in df.groupby(["organization", "project"], sort=False, observed=True).indices.items():
+            partition = df.iloc[positions]
+            # Categories of the whole dataset would travel with every sub-frame sent to a project process
+            for column in partition.select_dtypes("category").columns:
+                partition[column] = partition[column].cat.remove_unused_categories()
+            partitions[key] = partition
+        return partitions
+
+    def pop(self, organization: str, project: str) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+        # The partitions of a project are handed over once, memory is released as the projects advance
+        key = (organization, project)
+        dfa_project = self.analyses.pop(key, self.empty[0])
+        dfm_project = self.measures.pop(key, self.empty[1])
+        dfi_project = self.issues.pop(key, self.empty[2])
+        # Only the measures and issues of the analyses of the project
+        dfm_project = dfm_project[dfm_project["analysis_key"].isin(dfa_project["analysis_key"])]
+        dfi_project = dfi_project[dfi_project["current_analysis_key"].isin(dfa_project["analysis_key"])]
+        return dfa_project, dfm_project, dfi_project
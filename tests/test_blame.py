@@ -0,0 +1,109 @@
+import os
+import subprocess
+from datetime import datetime
+
+from blobs import BlobReader
+from gitlog import GitLogScanner
+from process import ProcessMetrics
+
+ALICE_OLD = ("Alice", "alice@old.example.org")
+ALICE = ("Alice", "alice@example.org")
+BOB = ("Bob", "bob@example.org")
+CAROL = ("Carol", "carol@example.org")
+
+
+class SyntheticGit:
+    def __init__(self, path):
+        self.path = path
+        self.commits = 0
+        self.git("init", "-q", "-b", "main")
+
+    def git(self, *args):
+        return subprocess.run(["git", "-C", self.path] + list(args), check=True, stdout=subprocess.PIPE).stdout.decode()
+
+    def write(self, name, lines):
+        with open(os.path.join(self.path, name), "w") as file:
+            file.write("".join(line + "\n" for line in lines))
+
+    def commit(self, author, *args):
+        self.commits += 1
+        date = "2020-01-01T00:{:02d}:00+00:00".format(self.commits)
+        env = dict(os.environ, GIT_AUTHOR_NAME=author[0], GIT_AUTHOR_EMAIL=author[1], GIT_AUTHOR_DATE=date,
+                   GIT_COMMITTER_NAME=author[0], GIT_COMMITTER_EMAIL=author[1], GIT_COMMITTER_DATE=date)
+        subprocess.run(["git", "-C", self.path, "add", "-A"], check=True, env=env)
+        subprocess.run(["git", "-C", self.path, "commit", "-q", "-m", "commit {}".format(self.commits)] + list(args), check=True, env=env)
+
+
+def build_history(path):
+    repo = SyntheticGit(path)
+    # Alice changed her email, .mailmap gives both the same identity
+    repo.write(".mailmap", ["Alice <alice@example.org> <alice@old.example.org>"])
+    repo.write("A.java", ["class A {", "    int a;", "    int b;", "    int c;", "}"])
+    repo.commit(ALICE_OLD)
+    repo.write("A.java", ["class A {", "    int a;", "    long b;", "    long c;", "    int d;", "}"])
+    repo.write("B.java", ["class B {", "}"])
+    repo.commit(BOB)
+    os.remove(os.path.join(path, "A.java"))
+    repo.write("C.java", ["class A {", "    int a;", "    long b;", "    long c;", "    int d;", "    int e;", "}"])
+    repo.commit(ALICE)
+    repo.git("checkout", "-q", "-b", "side")
+    repo.write("B.java", ["class B {", "    int side;", "}"])
+    repo.commit(BOB)
+    repo.git("checkout", "-q", "main")
+    repo.write("C.java", ["class A {", "    short a;", "    long b;", "    long c;", "    int d;", "    int e;", "}"])
+    repo.commit(ALICE_OLD)
+    repo.commit(CAROL, "--allow-empty")
+    subprocess.run(["git", "-C", path, "merge", "-q", "--no-edit", "side"], check=True, stdout=subprocess.DEVNULL,
+                   env=dict(os.environ, GIT_AUTHOR_NAME="Carol", GIT_AUTHOR_EMAIL=CAROL[1], GIT_COMMITTER_NAME="Carol", GIT_COMMITTER_EMAIL=CAROL[1]))
+    repo.write("B.java", ["class B {", "    int side;", "    int main;", "}"])
+    repo.commit(CAROL)
+
+
+def git_blame(path, commit_hash, file_path):
+    # Author of every line, as git blame reports it
+    output = subprocess.run(["git", "-C", path, "blame", "--line-porcelain", commit_hash, "--", file_path], check=True, stdout=subprocess.PIPE).stdout
+    return [line[len(b"author-mail "):].decode().strip("<>") for line in output.split(b"\n") if line.startswith(b"author-mail ")]
+
+
+def test_incremental_blame_matches_git_blame(tmp_path):
+    path = str(tmp_path)
+    build_history(path)
+    records = list(GitLogScanner(path).scan(datetime(2019, 1, 1), datetime(2021, 1, 1)))
+    blob_reader = BlobReader(path)
+    process = ProcessMetrics(path, blob_reader, 2)
+    try:
+        for record in records:
+            for change in record.changes:
+                metrics = process.get_process_metrics(record, change)
+                if change.new_path is None:
+                    assert metrics is None
+                    continue
+                expected = git_blame(path, record.hash, change.new_path)
+                assert process.blame(record, change) == expected
+                owned = sum(1 for author in expected if author == record.blame_email)
+                assert metrics == {"blame_authors": len(set(expected)), "blame_ownership": owned / len(expected) * 100}
+        # Incremental blames served the linear changes
+        assert process.incremental_blames > 0
+    finally:
+        process.close()
+        blob_reader.close()
+
+
+def test_mailmap_identity(tmp_path):
+    path = str(tmp_path)
+    build_history(path)
+    records = list(GitLogScanner(path).scan(datetime(2019, 1, 1), datetime(2021, 1, 1)))
+    # OEXP keeps the raw email, blame uses the one of .mailmap
+    assert [(record.author_email, record.blame_email) for record in records][:3] == [(ALICE_OLD[1], ALICE[1]), (BOB[1], BOB[1]), (ALICE[1], ALICE[1])]
+    blob_reader = BlobReader(path)
+    process = ProcessMetrics(path, blob_reader, 2)
+    try:
+        renamed = records[2]
+        change = next(change for change in renamed.changes if change.new_path == "C.java")
+        assert change.change_type == "R"
+        # Lines of the old email are owned by Alice, i.e., 3 of 7 lines by the first commit and 1 by the rename
+        assert process.get_process_metrics(records[0], records[0].changes[1])["blame_ownership"] == 100
+        assert process.get_process_metrics(renamed, change) == {"blame_authors": 2, "blame_ownership": 4 / 7 * 100}
+    finally:
+        process.close()
+        blob_reader.close()
@@ -0,0 +1,33 @@
+import io
+from datetime import timedelta
+
+from githubAPI import GithubParallelTraversing
+from githubGraphQL import GithubGraphQLTraversing
+from githubStub import GithubStubServer, SyntheticRepository
+
+
+def crawl(ght, repo):
+    ght.get_repo_details(repo.full_name)
+    start = repo.created_at(0)
+    stop = repo.created_at(len(repo.numbers) + 1) + timedelta(days=1)
+    pulls = list(ght.get_pull_record_many(ght.get_pull_list(start, stop), start, stop))
+    issues = list(ght.get_issue_details_many(ght.get_issue_list(start, stop)))
+    ght.close()
+    return pulls, issues
+
+
+def test_graphql_rows_match_rest_rows():
+    # Open, closed, and merged pulls, with issues in between
+    repo = SyntheticRepository(pull_count=15, issue_count=5, commits_per_pull=2, comments_per_pull=2, user_count=4)
+    server = GithubStubServer(repo=repo).start()
+    try:
+        rest = crawl(GithubParallelTraversing(["token0"], out_buffer=io.StringIO(), base_url=server.base_url), repo)
+        graphql = crawl(GithubGraphQLTraversing(["token1"], out_buffer=io.StringIO(), base_url=server.base_url), repo)
+    finally:
+        server.stop()
+    rest_pulls, rest_issues = rest
+    graphql_pulls, graphql_issues = graphql
+    assert len(rest_pulls) == 15 and len(rest_issues) == 20
+    assert {pull["state"] for pull in rest_pulls} == {"open", "closed"} and {pull["merged"] for pull in rest_pulls} == {True, False}
+    assert graphql_pulls == rest_pulls
+    assert graphql_issues == rest_issues
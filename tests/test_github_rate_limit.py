@@ -0,0 +1,63 @@
+import io
+import threading
+from datetime import timedelta
+
+from githubAPI import GithubParallelTraversing
+from githubStub import GithubStubServer, SyntheticRepository
+
+
+class CountingTraversing(GithubParallelTraversing):
+    waits = 0
+
+    def waiting_for_reset(self, gh):
+        CountingTraversing.waits += 1
+        return super().waiting_for_reset(gh)
+
+
+def crawl(server, repo, tokens, results):
+    ght = CountingTraversing(tokens, out_buffer=io.StringIO(), max_workers=2, base_url=server.base_url)
+    ght.get_repo_details(repo.full_name)
+    start = repo.created_at(0)
+    stop = repo.created_at(len(repo.numbers) + 1) + timedelta(days=1)
+    pull_list = ght.get_pull_list(start, stop)
+    results["records"] = list(ght.get_pull_record_many(pull_list, start, stop))
+    results["pulls"] = pull_list
+    ght.close()
+
+
+def test_exhausted_token_waits_for_the_next_window():
+    # A 2 s window of 15 requests, far less than the crawl needs, every token runs out several times
+    repo = SyntheticRepository(pull_count=6, issue_count=0, commits_per_pull=1, comments_per_pull=1, user_count=2)
+    server = GithubStubServer(repo=repo, rate_limit=15, rate_window=2).start()
+    try:
+        results = {}
+        thread = threading.Thread(target=crawl, args=(server, repo, ["token0"], results), daemon=True)
+        thread.start()
+        thread.join(120)
+        assert not thread.is_alive(), "the crawl never resumed after the rate-limit reset"
+        assert len(results["records"]) == len(results["pulls"]) == 6
+        assert server.state.total_requests() > 15
+        # A few waits per window, a stale reset in the past would make it spin without sending any request
+        assert 0 < CountingTraversing.waits <= 20
+        # Waits are taken before the quota runs out, GitHub never answers 403
+        assert server.state.rate_limited == 0
+    finally:
+        server.stop()
+
+
+def test_pull_requests_are_spread_over_the_tokens():
+    # Details, commits, comments, and users of a pull are sent with the token acquired for it, not the one of the listing
+    repo = SyntheticRepository(pull_count=16, issue_count=0, commits_per_pull=1, comments_per_pull=1, user_count=16)
+    server = GithubStubServer(repo=repo, rate_limit=1000, rate_window=3600).start()
+    try:
+        tokens = ["token{}".format(index) for index in range(4)]
+        results = {}
+        crawl(server, repo, tokens, results)
+        assert len(results["records"]) == len(results["pulls"]) == 16
+        used = [server.state.rate_limit - server.state.windows[token][0] for token in tokens]
+        assert sum(used) == server.state.total_requests()
+        # Every token serves a fair share of the pulls, beyond its login and repository requests
+        assert min(used) > sum(used) // 8
+        assert server.state.rate_limited == 0
+    finally:
+        server.stop()
@@ -0,0 +1,140 @@
+from readability import JavaSnippets
+
+SOURCE = """package demo;
+
+import java.util.List;
+
+public class Sample {
+    private static final int[] PRIMES = {2, 3, 5};
+    private final Runnable task = () -> { System.out.println("{"); };
+    private final Object listener = register(new Listener() {
+        @Override
+        public void changed(int value) {
+            System.out.println(value);
+        }
+    });
+    private int count;
+
+    static {
+        System.out.println("static initializer");
+    }
+
+    {
+        count = 1;
+    }
+
+    @SuppressWarnings({"unchecked", "rawtypes"})
+    public List<String> annotated(List raw) {
+        return (List<String>) raw;
+    }
+
+    // Sorts with a lambda and an anonymous comparator
+    public void sort(List<String> values) {
+        values.forEach(value -> { count++; });
+        values.sort(new java.util.Comparator<String>() {
+            public int compare(String a, String b) {
+                return a.compareTo(b);
+            }
+        });
+    }
+
+    @Deprecated(since = "1")
+    public Sample() {
+        this(new int[]{1});
+    }
+
+    private Sample(int[] values) {
+        count = values.length;
+    }
+
+    private static Object register(Object listener) {
+        return listener;
+    }
+
+    interface Listener {
+        default void changed(int value) {
+        }
+    }
+}
+"""
+
+
+def member_texts(source):
+    return [source[start:end] for start, end in JavaSnippets.members(source)]
+
+
+def line_of(source, text):
+    return source[:source.index(text)].count("\n")
+
+
+def test_members_keep_annotations_with_array_arguments():
+    members = member_texts(SOURCE)
+    annotated = next(member for member in members if "annotated" in member)
+    assert annotated.startswith('@SuppressWarnings({"unchecked", "rawtypes"})\n    public List<String> annotated(List raw) {')
+    assert annotated.endswith("}")
+    # The annotation array is not a member on its own
+    assert not any(member.startswith("@SuppressWarnings") and "annotated" not in member for member in members)
+    assert not any(member.lstrip().startswith(")") for member in members)
+
+
+def test_members_of_the_type_body():
+    members = member_texts(SOURCE)
+    starts = [member.split("\n", 1)[0] for member in members]
+    # Field initializers, lambdas, and argument blocks are not members, initializers and the members of named nested types are
+    assert starts == ["static {",
+                      "{",
+                      '@SuppressWarnings({"unchecked", "rawtypes"})',
+                      "// Sorts with a lambda and an anonymous comparator",
+                      '@Deprecated(since = "1")',
+                      "private Sample(int[] values) {",
+                      "private static Object register(Object listener) {",
+                      "default void changed(int value) {"]
+
+
+def test_extract_lambda_and_anonymous_class_in_the_enclosing_method():
+    snippet = JavaSnippets.extract(SOURCE, {line_of(SOURCE, "return a.compareTo(b);")})
+    assert snippet.startswith("class Snippet {\n// Sorts with a lambda and an anonymous comparator\n    public void sort(List<String> values) {")
+    assert snippet.count("{") == snippet.count("}")
+    assert "values.forEach(value -> { count++; });" in snippet
+    assert "annotated" not in snippet
+
+
+def test_extract_initializers_and_annotated_members():
+    lines = {line_of(SOURCE, "count = 1;"), line_of(SOURCE, "return (List<String>) raw;"), line_of(SOURCE, "this(new int[]{1});")}
+    snippet = JavaSnippets.extract(SOURCE, lines)
+    assert snippet == ("class Snippet {\n"
+                       "{\n        count = 1;\n    }\n\n"
+                       '@SuppressWarnings({"unchecked", "rawtypes"})\n    public List<String> annotated(List raw) {\n        return (List<String>) raw;\n    }\n\n'
+                       '@Deprecated(since = "1")\n    public Sample() {\n        this(new int[]{1});\n    }'
+                       "\n}\n")
+
+
+def test_extract_field_changes_select_nothing():
+    assert JavaSnippets.extract(SOURCE, {line_of(SOURCE, "private int count;")}) is None
+
+
+def test_switch_expressions_and_annotation_defaults_are_not_members():
+    source = """@interface Config {
+    String[] value() default {};
+    int[] sizes() default { 1, 2 };
+}
+
+class Switches {
+    static final int X = switch (Y) {
+        case 1 -> { yield 2; }
+        default -> { yield 3; }
+    };
+
+    @Named(value = "x")
+    int annotated(int y) {
+        return switch (y) { default -> 0; };
+    }
+
+    interface Defaults {
+        default void method() {
+        }
+    }
+}
+"""
+    assert [member.split("\n", 1)[0] for member in member_texts(source)] == ['@Named(value = "x")', "default void method() {"]
+    assert JavaSnippets.extract(source, {line_of(source, "case 1")}) is None
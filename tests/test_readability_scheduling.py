@@ -0,0 +1,57 @@
+from readability import Readability, ReadabilityCostModel, ReadabilityExecutor, ReadabilityRun
+
+
+def test_cost_model_prefers_measured_runtimes():
+    model = ReadabilityCostModel()
+    # Before any run, the size orders the blobs
+    assert model.estimate("a", 300) > model.estimate("b", 100)
+    model.observe("a", 300, 1.0, 1.0)
+    model.observe("b", 100, 9.0, 9.0)
+    # Measured blobs keep their runtime, whatever their size
+    assert model.estimate("b", 100) > model.estimate("a", 300)
+    # The others cost the mean runtime per byte, i.e., 10 s for 400 bytes
+    assert model.estimate("c", 200) == 5.0
+
+
+def test_cost_model_forgets_the_oldest_blobs():
+    model = ReadabilityCostModel()
+    model.MAX_BLOBS = 2
+    for blob in ("a", "b", "c"):
+        model.observe(blob, 10, 1.0, 0.0)
+    assert list(model.blobs) == ["b", "c"]
+
+
+def test_executor_starts_the_longest_measured_job_first(tmp_path):
+    readability = Readability("rsm.jar", str(tmp_path / "temp.java"), 60)
+    # The small source took far longer than its size tells
+    readability.cost_model.observe(Readability.hash_blob(b"other"), 10000, 1.0, 1.0)
+    readability.cost_model.observe(Readability.hash_blob(b"small"), 5, 30.0, 30.0)
+    order = []
+    readability.get_delta = lambda before, current: order.append(before)
+    executor = ReadabilityExecutor(readability, 1)
+    try:
+        executor.get_deltas([("a much larger source", "a much larger source"), ("small", "small")])
+    finally:
+        executor.close()
+    assert order == ["small", "a much larger source"]
+
+
+def test_only_timed_out_runs_are_quarantined(tmp_path):
+    readability = Readability("rsm.jar", str(tmp_path / "temp.java"), 1)
+    runs = {"slow": ReadabilityRun(seconds=1.0, timed_out=True), "failed": ReadabilityRun(seconds=0.1)}
+    readability.run_extract_metrics = lambda filename: runs[open(filename).read()]
+    assert readability.get_readability("slow") is None
+    assert readability.get_readability("failed") is None
+    assert readability.quarantine.get(Readability.hash_blob(b"slow")) == 1
+    assert readability.quarantine.get(Readability.hash_blob(b"failed")) is None
+    # Quarantined blobs are skipped, failed ones are run again
+    assert readability.cost_model.estimate(Readability.hash_blob(b"slow"), 4) == 0.0
+    assert readability.cost_model.estimate(Readability.hash_blob(b"failed"), 6) == 0.1
+
+
+def test_command_timeout_is_reported(tmp_path):
+    readability = Readability("rsm.jar", str(tmp_path / "temp.java"), 1)
+    run = readability.run_command(["sleep", "5"])
+    assert run.timed_out and run.stdout is None
+    run = readability.run_command(["true"])
+    assert not run.timed_out and run.stdout == "" and run.seconds < 1
@@ -0,0 +1,24 @@
+import os
+
+from scheduler import ProjectScheduler
+
+
+class SlotContext:
+    def __init__(self, slot, slot_count, path):
+        self.slot = slot
+        self.path = path
+
+    def close(self):
+        with open(os.path.join(self.path, "closed_{}".format(self.slot)), "w"):
+            pass
+
+
+def run_project(context, io_semaphore, number):
+    return "done"
+
+
+def test_parallel_contexts_are_closed(tmp_path):
+    statuses = ProjectScheduler(3, 1).run(SlotContext, (str(tmp_path),), run_project, [("p{}".format(i), (i,)) for i in range(6)])
+    assert [status.status for status in statuses] == ["done"] * 6
+    # Every pool process closes the context of its slot when the pool shuts down
+    assert sorted(os.listdir(tmp_path)) == ["closed_0", "closed_1", "closed_2"]
@@ -1,12 +1,13 @@
 import os
-import csv
-from csv import DictWriter
+import json
+import time
 
 from tqdm import tqdm
 from threading import Lock
-from typing import Dict, List, Optional, TextIO
+from typing import Any, Dict, List, Optional
 from pydriller import ModifiedFile, ModificationType, Repository, Git
 from git import GitCommandError
+from writers import AsyncCsvWriter, ParquetSink
 
 
 class MyProgressBar:
@@ -41,19 +42,24 @@ class GitHubBean:
 
         self.file_report = None
         self.file_exception = None
-        self.file_result = None
-        self.file_stat = None
-        self.file_pull = None
-        self.file_issue = None
+        self.csv_compression = "none"
+        self.parquet = False
         self.result_writer = None
         self.stat_writer = None
         self.pull_writer = None
         self.issue_writer = None
+        self.oexp_writer = None
         self.bar = None
 
+        # Progress journal, see checkpoint()
+        self.journal_path = os.path.join(self.clone_path, "{}_journal.json".format(self.name))
+        self.resuming = False
+        self.checkpoint_seconds = 5
+        self.last_checkpoint = 0
+
     def print_report(self, message: str) -> None:
         if self.file_report is None:
-            self.file_report = open(os.path.join(self.clone_path, "{}_report.txt".format(self.name)), 'w')
+            self.file_report = open(os.path.join(self.clone_path, "{}_report.txt".format(self.name)), 'a' if self.resuming else 'w')
         self.file_report.write(message)
         if not message.endswith('\n') and not message.endswith('\r'):
             self.file_report.write("\r\n")
@@ -61,28 +67,32 @@ class GitHubBean:
 
     def print_exception(self, message: str) -> None:
         if self.file_exception is None:
-            self.file_exception = open(os.path.join(self.clone_path, "{}_exception.txt".format(self.name)), 'w')
+            self.file_exception = open(os.path.join(self.clone_path, "{}_exception.txt".format(self.name)), 'a' if self.resuming else 'w')
         self.file_exception.write(message)
         if not message.endswith('\n') and not message.endswith('\r'):
             self.file_exception.write("\r\n")
         self.file_exception.flush()
 
-    # def _create_csv(self, filename: str, header: List[str]) -> tuple[TextIO, DictWriter[str]]:
-    def _create_csv(self, filename: str, header: List[str]):
-        filename = os.path.join(self.clone_path, "{}_{}.csv".format(self.name, filename))
-        file = open(filename, 'w', newline='', encoding="utf-8")
-        writer = csv.DictWriter(file, fieldnames=header, delimiter=',', extrasaction='ignore')
-        writer.writeheader()
-        return file, writer
+    def _create_csv(self, filename: str, header: List[str], offset: Optional[int] = None, types: Optional[Dict[str, str]] = None) -> AsyncCsvWriter:
+        path = os.path.join(self.clone_path, "{}_{}".format(self.name, filename))
+        # Typed copy of the same rows, see ParquetSink for the column types
+        columnar = ParquetSink(path + ".parquet", header, types if types is not None else {}) if self.parquet else None
+        # Resume when an offset is given, the rows written after the last checkpoint are dropped and new ones appended after it
+        return AsyncCsvWriter(path + ".csv", header, offset, self.csv_compression, columnar=columnar)
+
+    def create_csvs(self, header: List[str], offsets: Optional[Dict[str, int]] = None, result_types: Optional[Dict[str, str]] = None,
+                    oexp: bool = True) -> None:
+        offsets = offsets if offsets is not None else {}
 
-    def create_csvs(self, header: List[str]) -> None:
         # Result CSV
-        self.file_result, self.result_writer = self._create_csv("result", header)
+        self.result_writer = self._create_csv("result", header, offsets.get("result"), result_types)
 
         # Stats CSV
         header = ["project", "commit_hash", "committer_date", "modified_files", "modified_file_count", "author_email", "committer_email", "sonar_analyses",
                   "sonar_measures", "sonar_issues"]
-        self.file_stat, self.stat_writer = self._create_csv("stat", header)
+        types = {"committer_date": "timestamp", "modified_files": "list", "modified_file_count": "int", "sonar_analyses": "int", "sonar_measures": "int",
+                 "sonar_issues": "int"}
+        self.stat_writer = self._create_csv("stat", header, offsets.get("stat"), types)
 
         # Pull Requests CSV
         header = ['name', 'language', 'created_at', 'default_branch', 'description', 'fork_count', 'url',
@@ -94,7 +104,11 @@ class GitHubBean:
                   'created_by_login', 'created_by_name', 'created_by_email',
                   'merge_commit', 'base_commit', 'head_commit', 'commit_list',
                   'comment_list_login', 'comment_list_name', 'comment_list_email']
-        self.file_pull, self.pull_writer = self._create_csv("pull", header)
+        types = {'created_at': "timestamp", 'fork_count': "int", 'pull_number': "int", 'merged': "bool", 'comment_count': "int", 'commit_count': "int",
+                 'changed_file_count': "int", 'total_addition_count': "int", 'total_deletion_count': "int", 'merged_at': "timestamp",
+                 'closed_at': "timestamp", 'updated_at': "timestamp", 'commit_list': "list", 'comment_list_login': "list", 'comment_list_name': "list",
+                 'comment_list_email': "list"}
+        self.pull_writer = self._create_csv("pull", header, offsets.get("pull"), types)
 
         # Issue CSV
         header = ['name', 'language', 'created_at', 'default_branch', 'description', 'fork_count', 'url',
@@ -102,31 +116,71 @@ class GitHubBean:
                   'title', 'state', 'comment_count',  # 'body', DO NOT INCLUDE BODY IN CSV
                   'created_at', 'closed_at', 'updated_at',
                   'created_by_login', 'created_by_name', 'created_by_email']
-        self.file_issue, self.issue_writer = self._create_csv("issue", header)
+        types = {'created_at': "timestamp", 'fork_count': "int", 'issue_number': "int", 'comment_count': "int", 'closed_at': "timestamp",
+                 'updated_at': "timestamp"}
+        self.issue_writer = self._create_csv("issue", header, offsets.get("issue"), types)
+
+        # OEXP CSV, one row per commit for its author, see OexpTracker.sparse. The wide layout has OEXP in the result CSV instead
+        if oexp:
+            header = ["commit_index", "commit_hash", "author_email", "authored_lines", "total_lines", "share"]
+            types = {"commit_index": "int", "authored_lines": "int", "total_lines": "int", "share": "float"}
+            self.oexp_writer = self._create_csv("oexp", header, offsets.get("oexp"), types)
+
+    # Rows are written and flushed in batches by the writer threads, checkpoint() and close() make them durable
 
     def append_result(self, csv_dict: Dict[str, str]) -> None:
         self.result_writer.writerow(csv_dict)
-        self.file_result.flush()
 
     def append_stat(self, csv_dict: Dict[str, str]) -> None:
         self.stat_writer.writerow(csv_dict)
-        self.file_stat.flush()
 
     def append_pull(self, csv_dict: Dict[str, str]) -> None:
         self.pull_writer.writerow(csv_dict)
-        self.file_pull.flush()
 
     def append_issue(self, csv_dict: Dict[str, str]) -> None:
         self.issue_writer.writerow(csv_dict)
-        self.file_issue.flush()
+
+    def append_oexp(self, csv_dict: Dict[str, str]) -> None:
+        self.oexp_writer.writerow(csv_dict)
+
+    def load_journal(self) -> Optional[Dict[str, Any]]:
+        if not os.path.exists(self.journal_path):
+            return None
+        with open(self.journal_path, 'r') as file:
+            journal = json.load(file)
+        self.resuming = True
+        return journal
+
+    def csv_offsets(self) -> Dict[str, int]:
+        # Make rows durable before recording where they end
+        offsets = {}
+        for name, writer in (("result", self.result_writer), ("stat", self.stat_writer), ("pull", self.pull_writer), ("issue", self.issue_writer),
+                               ("oexp", self.oexp_writer)):
+            if writer is not None:
+                offsets[name] = writer.sync()
+        return offsets
+
+    def checkpoint(self, journal: Dict[str, Any], force: bool = False) -> None:
+        # Throttled, a crash loses at most checkpoint_seconds of work, which is redone on resume
+        now = time.monotonic()
+        if not force and now - self.last_checkpoint < self.checkpoint_seconds:
+            return
+        self.last_checkpoint = now
+
+        journal["offsets"] = self.csv_offsets()
+        temp_path = self.journal_path + ".tmp"
+        with open(temp_path, 'w') as file:
+            json.dump(journal, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, self.journal_path)
 
     def close(self):
-        self.file_report.close()
-        self.file_result.close()
-        self.file_stat.close()
-        self.file_pull.close()
-        self.file_issue.close()
-        self.bar.close()
+        # Also called when the analysis failed, only what has been opened is closed
+        for resource in (self.file_report, self.file_exception, self.result_writer, self.stat_writer, self.pull_writer, self.issue_writer,
+                         self.oexp_writer, self.bar):
+            if resource is not None:
+                resource.close()
 
     def create_progress_bar(self, bar_size: int) -> None:
         self.bar = MyProgressBar(bar_size)
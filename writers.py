@@ -0,0 +1,303 @@
+import ast
+import csv
+import gzip
+import io
+import math
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+COMPRESSIONS = {"none": "", "gzip": ".gz", "zstd": ".zst"}
+
+
+class _Sync:
+    # Queued after the rows it must make durable, the writer thread answers with the file size
+    def __init__(self):
+        self.done = threading.Event()
+        self.offset = 0
+
+
+class BlockSink:
+    # Bytes go to the file in independent blocks, i.e., gzip members or zstd frames. A file truncated at a block boundary is still valid,
+    # and new blocks can be appended to it
+    def __init__(self, filename: str, compression: str, offset: Optional[int]):
+        if offset is None:
+            self.file = open(filename, 'wb')
+        else:
+            os.truncate(filename, offset)
+            self.file = open(filename, 'ab')
+        self.compression = compression
+        self.block = None
+
+    def write(self, data: bytes) -> None:
+        if self.compression == "none":
+            self.file.write(data)
+            return
+        if self.block is None:
+            if self.compression == "gzip":
+                self.block = gzip.GzipFile(fileobj=self.file, mode='wb', compresslevel=6)
+            else:
+                self.block = zstandard.ZstdCompressor(level=3).stream_writer(self.file, closefd=False)
+        self.block.write(data)
+
+    def end_block(self) -> None:
+        if self.block is not None:
+            if self.compression == "gzip":
+                self.block.close()
+            else:
+                self.block.flush(zstandard.FLUSH_FRAME)
+                self.block.close()
+            self.block = None
+
+    def flush(self) -> None:
+        # Hand the written bytes to the OS, compressors keep a partial block until end_block
+        if self.block is not None and self.compression == "zstd":
+            self.block.flush(zstandard.FLUSH_BLOCK)
+        self.file.flush()
+
+    def sync(self) -> int:
+        self.end_block()
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        return os.fstat(self.file.fileno()).st_size
+
+    def close(self) -> None:
+        self.sync()
+        self.file.close()
+
+
+class ParquetSink:
+    # Column types: string (default), int, float, bool, timestamp, and list (of strings)
+    def __init__(self, filename: str, header: List[str], types: Dict[str, str], row_group_rows: int = 10000):
+        if pyarrow is None:
+            raise ValueError("Parquet output requires the pyarrow package")
+        self.filename = filename
+        self.row_group_rows = row_group_rows
+        self.converters = []
+        fields = []
+        for index, name in enumerate(header):
+            column_type = types.get(name, "string")
+            self.converters.append(getattr(self, "to_" + column_type))
+            # Parquet columns need unique names, the CSV header may repeat one
+            fields.append(pyarrow.field(name if name not in header[:index] else "{}.{}".format(name, index), self.ARROW_TYPES[column_type]()))
+        self.schema = pyarrow.schema(fields)
+        self.columns: list[list[Any]] = [[] for _ in header]
+        self.rows = 0
+        # Written to a temporary file, a Parquet file is only readable once its footer is written
+        self.writer = pyarrow.parquet.ParquetWriter(filename + ".tmp", self.schema, compression="zstd")
+
+    ARROW_TYPES = {"string": lambda: pyarrow.string(), "int": lambda: pyarrow.int64(), "float": lambda: pyarrow.float64(),
+                   "bool": lambda: pyarrow.bool_(), "timestamp": lambda: pyarrow.timestamp("us", tz="UTC"),
+                   "list": lambda: pyarrow.list_(pyarrow.string())}
+
+    # Converters take the native values of a live run and the CSV text of a resumed one, values that do not fit their column are null
+
+    @staticmethod
+    def is_missing(value: Any) -> bool:
+        return value is None or (isinstance(value, str) and value == "") or (isinstance(value, float) and math.isnan(value))
+
+    @staticmethod
+    def to_string(value: Any) -> Optional[str]:
+        # A CSV cannot tell None from an empty string, both are null
+        return None if value is None or value == "" else str(value)
+
+    @classmethod
+    def to_int(cls, value: Any) -> Optional[int]:
+        if cls.is_missing(value):
+            return None
+        try:
+            return int(value)
+        except ValueError:
+            return int(float(value))
+
+    @classmethod
+    def to_float(cls, value: Any) -> Optional[float]:
+        return None if cls.is_missing(value) else float(value)
+
+    @classmethod
+    def to_bool(cls, value: Any) -> Optional[bool]:
+        if cls.is_missing(value):
+            return None
+        return value if isinstance(value, bool) else str(value) == "True"
+
+    @classmethod
+    def to_timestamp(cls, value: Any) -> Optional[datetime]:
+        if cls.is_missing(value):
+            return None
+        if not isinstance(value, datetime):
+            value = datetime.fromisoformat(str(value))
+        # Naive dates are UTC, as the GitHub and git ones
+        return value if value.tzinfo is not None else value.replace(tzinfo=timezone.utc)
+
+    @classmethod
+    def to_list(cls, value: Any) -> Optional[List[Optional[str]]]:
+        if value is None:
+            return None
+        if isinstance(value, str):
+            # CSV cells hold the repr of the list
+            value = ast.literal_eval(value) if value.startswith("[") else [value]
+        return [None if item is None else str(item) for item in value]
+
+    def append(self, values: List[Any]) -> None:
+        for column, converter, value in zip(self.columns, self.converters, values):
+            try:
+                column.append(converter(value))
+            except (ValueError, TypeError, SyntaxError):
+                column.append(None)
+        self.rows += 1
+        if self.rows >= self.row_group_rows:
+            self.write_row_group()
+
+    def write_row_group(self) -> None:
+        if self.rows:
+            self.writer.write_table(pyarrow.Table.from_arrays([pyarrow.array(column, type=field.type) for column, field in zip(self.columns, self.schema)],
+                                                              schema=self.schema))
+            self.columns = [[] for _ in self.columns]
+            self.rows = 0
+
+    def close(self) -> None:
+        self.write_row_group()
+        self.writer.close()
+        os.replace(self.filename + ".tmp", self.filename)
+
+
+def read_csv_rows(filename: str, compression: str) -> Iterator[List[str]]:
+    if compression == "gzip":
+        file = gzip.open(filename, 'rt', newline='', encoding="utf-8")
+    elif compression == "zstd":
+        file = io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(open(filename, 'rb'), read_across_frames=True, closefd=True),
+                                newline='', encoding="utf-8")
+    else:
+        file = open(filename, 'r', newline='', encoding="utf-8")
+    with file:
+        yield from csv.reader(file, delimiter=',')
+
+
+class AsyncCsvWriter:
+    def __init__(self, filename: str, header: List[str], offset: Optional[int] = None, compression: str = "none", queue_rows: int = 10000,
+                 batch_rows: int = 500, flush_seconds: float = 1.0, columnar: Optional[ParquetSink] = None):
+        if compression not in COMPRESSIONS:
+            raise ValueError("Unknown CSV compression: {}".format(compression))
+        if compression == "zstd" and zstandard is None:
+            raise ValueError("zstd CSV compression requires the zstandard package")
+
+        self.filename = filename + COMPRESSIONS[compression]
+        self.header = header
+        self.batch_rows = batch_rows
+        self.flush_seconds = flush_seconds
+        self.compression = compression
+        self.sink = BlockSink(self.filename, compression, offset)
+        # Optional typed copy of the rows, it is rebuilt from the CSV on resume and completed on close
+        self.columnar = columnar
+        self.write_header = offset is None
+        # Bounded, a slow disk holds back the producers instead of filling the memory
+        self.queue: queue.Queue = queue.Queue(maxsize=queue_rows)
+        self.error: Optional[BaseException] = None
+        self.closed = False
+
+        self.thread = threading.Thread(target=self._run, name="csv-writer", daemon=True)
+        self.thread.start()
+
+    def _check(self) -> None:
+        if self.error is not None:
+            raise RuntimeError("CSV writer of {} failed".format(self.filename)) from self.error
+
+    def writerow(self, row: Dict[str, Any]) -> None:
+        # Values are taken now, callers may change and append the same dictionary again. Missing keys are empty and unknown ones are ignored,
+        # as DictWriter with extrasaction='ignore'
+        self._check()
+        self.queue.put([row.get(key, "") for key in self.header])
+
+    def sync(self) -> int:
+        # Rows appended so far are on disk once it returns, the offset is a block boundary where the file can be truncated on resume
+        self._check()
+        request = _Sync()
+        self.queue.put(request)
+        while not request.done.wait(1):
+            self._check()
+        self._check()
+        return request.offset
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.put(None)
+        self.thread.join()
+        self._check()
+
+    def _run(self) -> None:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, delimiter=',')
+        pending = 0
+        last_flush = time.monotonic()
+
+        def write_buffer():
+            self.sink.write(buffer.getvalue().encode("utf-8"))
+            buffer.seek(0)
+            buffer.truncate()
+
+        try:
+            if self.write_header:
+                writer.writerow(self.header)
+                pending += 1
+            elif self.columnar is not None:
+                # Rows of the previous runs, the CSV has just been truncated at the last checkpoint
+                self.sink.file.flush()
+                rows = read_csv_rows(self.filename, self.compression)
+                next(rows, None)
+                for row in rows:
+                    self.columnar.append(row)
+
+            while True:
+                timeout = max(0.0, self.flush_seconds - (time.monotonic() - last_flush))
+                try:
+                    item = self.queue.get(timeout=timeout if pending else None)
+                except queue.Empty:
+                    item = False
+
+                if isinstance(item, list):
+                    writer.writerow(item)
+                    if self.columnar is not None:
+                        self.columnar.append(item)
+                    pending += 1
+                    if pending < self.batch_rows:
+                        continue
+                if pending:
+                    write_buffer()
+                    self.sink.flush()
+                    pending = 0
+                    last_flush = time.monotonic()
+
+                if isinstance(item, _Sync):
+                    item.offset = self.sink.sync()
+                    item.done.set()
+                elif item is None:
+                    self.sink.close()
+                    if self.columnar is not None:
+                        self.columnar.close()
+                    return
+        except BaseException as exception:
+            self.error = exception
+            # Unblock producers and sync callers, they find the error on their next call
+            while True:
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if isinstance(item, _Sync):
+                    item.done.set()